@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+================================================================================
+TCM 正念日曆 - 冥想音檔生成流程效能測試
+================================================================================
+
+以離線的替代語音（ToneBackend）取代 edge-tts，量測腳本生成、語音合成、
+靜音、淡入淡出、解碼編碼與各種組合方式的完整草藥生成；結果可存成基準檔，
+之後的執行與基準比較，找出效能退步。
+
+使用方式：
+    py bench_meditations.py                              # 執行全部項目
+    py bench_meditations.py --only herb.pcm herb.stream  # 只執行指定項目
+    py bench_meditations.py --save bench_baseline.json   # 存成基準
+    py bench_meditations.py --compare bench_baseline.json  # 與基準比較
+    py bench_meditations.py --tts-latency 0.3            # 模擬每次語音請求的網路延遲
+
+比較時草藥、並行數與模擬延遲等設定必須與基準相同，否則拒絕比較。
+所有輸出都寫在暫存目錄，不會動到 public/meditations 與語音快取。
+================================================================================
+"""
+
+import asyncio
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime
+
+import generate_all_meditations as gam
+
+BENCH_VERSION = 2
+REGRESSION_TOLERANCE = 0.10  # 比基準慢超過此比例視為退步
+
+
+# ============================================================================
+# 量測工具
+# ============================================================================
+
+class BenchRun:
+    """單一項目的量測結果：每次重複的秒數，以及換算吞吐量用的工作量"""
+    
+    def __init__(self, name: str, seconds: list, work: float = 0.0, unit: str = "",
+                 audio_sec: float = 0.0, herbs: int = 0, stages: list = None):
+        self.name = name
+        self.seconds = seconds
+        self.work = work
+        self.unit = unit
+        self.audio_sec = audio_sec
+        self.herbs = herbs
+        self.stages = stages or []
+    
+    @property
+    def median(self) -> float:
+        return statistics.median(self.seconds)
+    
+    def throughput(self) -> str:
+        parts = []
+        if self.work and self.unit:
+            parts.append(f"{self.work / self.median:,.1f} {self.unit}/s")
+        if self.herbs:
+            parts.append(f"{self.herbs / self.median * 60:.1f} herbs/min")
+        if self.audio_sec:
+            parts.append(f"{self.audio_sec / self.median:,.1f}x 即時")
+        return "，".join(parts)
+    
+    def to_json(self) -> dict:
+        return {
+            "median": self.median, "min": min(self.seconds), "runs": self.seconds,
+            "work": self.work, "unit": self.unit, "audio_sec": self.audio_sec, "herbs": self.herbs,
+        }
+
+
+def measure(function, repeat: int) -> list:
+    """同步函式重複執行 repeat 次，回傳每次的秒數"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+async def measure_async(factory, repeat: int, setup=None) -> list:
+    """非同步版本；setup 在每次計時前執行（例如清空快取），不計入時間"""
+    seconds = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        await factory()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+# ============================================================================
+# 測試項目
+# ============================================================================
+
+class Bench:
+    """所有測試項目共用的設定與暫存目錄"""
+    
+    def __init__(self, work_dir: Path, herbs: list, repeat: int, jobs: int, tts_latency: float):
+        self.work_dir = work_dir
+        self.herbs = herbs
+        self.repeat = repeat
+        self.jobs = jobs
+        self.tts_latency = tts_latency
+        # 生成流程讀取模組層級的目錄設定，全部導向暫存目錄
+        gam.OUTPUT_DIR = work_dir / "out"
+        gam.TEMP_DIR = work_dir / "temp"
+        gam.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        self.cache_dir = work_dir / "cache"
+        self.backend = gam.ToneBackend(latency=tts_latency)
+        self.lines = sorted({text for herb in herbs
+                             for text, _ in gam.generate_meditation_script(herb) if text.strip()})
+    
+    def tts_client(self, cache_dir: Path = None) -> gam.TTSClient:
+        cache = gam.TTSCache(cache_dir or self.cache_dir, max_bytes=1 << 40)
+        return gam.TTSClient(gam.TTS_CONCURRENCY, cache, backend=self.backend)
+    
+    def reset_cache(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    # --- 個別階段 ---
+    
+    async def bench_script(self) -> BenchRun:
+        rounds = 200
+        def run():
+            for _ in range(rounds):
+                for herb in gam.HERBS_DATABASE:
+                    gam.generate_meditation_script(herb)
+        seconds = measure(run, self.repeat)
+        return BenchRun("script", seconds, work=rounds * len(gam.HERBS_DATABASE), unit="scripts")
+    
+    async def bench_tts(self) -> BenchRun:
+        async def run():
+            tts = self.tts_client()
+            await asyncio.gather(*(tts.audio(text) for text in self.lines))
+        seconds = await measure_async(run, self.repeat, setup=self.reset_cache)
+        return BenchRun("tts.cold", seconds, work=len(self.lines), unit="segments")
+    
+    async def bench_tts_cached(self) -> BenchRun:
+        tts = self.tts_client()
+        await asyncio.gather(*(tts.audio(text) for text in self.lines))
+        async def run():
+            await asyncio.gather(*(tts.audio(text) for text in self.lines))
+        seconds = await measure_async(run, self.repeat)
+        return BenchRun("tts.cached", seconds, work=len(self.lines), unit="segments")
+    
+    async def bench_silence(self) -> BenchRun:
+        pauses = [pause for herb in self.herbs for _, pause in gam.generate_meditation_script(herb)]
+        seconds = measure(lambda: [gam.silence_pcm(p) for p in pauses], self.repeat)
+        return BenchRun("silence", seconds, audio_sec=sum(pauses))
+    
+    async def herb_pcm(self) -> bytes:
+        """第一個草藥的完整 PCM（不含淡入淡出），供解碼以外的階段使用"""
+        tts = self.tts_client()
+        parts = []
+        for text, pause in gam.generate_meditation_script(self.herbs[0]):
+            if text.strip():
+                audio = await tts.audio(text)
+                parts.append(gam.decode_to_pcm(audio.data))
+            parts.append(gam.silence_pcm(pause))
+        return b"".join(parts)
+    
+    async def bench_decode(self) -> BenchRun:
+        tts = self.tts_client()
+        audio = [await tts.audio(text) for text in self.lines[:20]]
+        seconds = measure(lambda: [gam.decode_to_pcm(a.data) for a in audio], self.repeat)
+        return BenchRun("decode", seconds, work=len(audio), unit="segments",
+                        audio_sec=sum(a.duration for a in audio))
+    
+    async def bench_fade(self) -> BenchRun:
+        pcm = await self.herb_pcm()
+        seconds = measure(lambda: gam.apply_fades(pcm), self.repeat)
+        return BenchRun("fade", seconds, audio_sec=len(pcm) / 2 / gam.SAMPLE_RATE)
+    
+    async def bench_encode(self) -> BenchRun:
+        pcm = await self.herb_pcm()
+        output = self.work_dir / "encode.mp3"
+        seconds = measure(lambda: gam.encode_pcm(pcm, output), self.repeat)
+        return BenchRun("encode", seconds, audio_sec=len(pcm) / 2 / gam.SAMPLE_RATE)
+    
+    # --- 完整草藥 ---
+    
+    async def render(self, assembly: str, tts: gam.TTSClient) -> float:
+        """生成所有選定的草藥，回傳輸出的總音訊長度（秒）"""
+        semaphore = asyncio.Semaphore(self.jobs)
+        results = await asyncio.gather(*(gam.render_herb(herb, semaphore, tts=tts, assembly=assembly)
+                                         for herb in self.herbs))
+        failed = [r for r in results if not r["output"]]
+        if failed:
+            raise RuntimeError(f"{failed[0]['herb']['name']} 生成失敗：{failed[0]['error']}")
+        return sum(gam.mp3_duration(r["output"].read_bytes()) for r in results)
+    
+    def herb_bench(self, assembly: str, warm: bool):
+        async def bench() -> BenchRun:
+            audio_sec = 0.0
+            if warm:
+                await self.render(assembly, self.tts_client())
+            
+            async def run():
+                nonlocal audio_sec
+                audio_sec = await self.render(assembly, self.tts_client())
+            
+            gam.TRACER = gam.Tracer()
+            seconds = await measure_async(run, self.repeat, setup=None if warm else self.reset_cache)
+            stages = [(name, count, spent) for name, count, _, _, spent in gam.TRACER.summary()]
+            return BenchRun(f"herb.{assembly}" + ("" if warm else ".cold"), seconds,
+                            herbs=len(self.herbs), audio_sec=audio_sec, stages=stages)
+        return bench
+    
+    def benchmarks(self) -> dict:
+        items = {
+            "script": self.bench_script,
+            "tts.cold": self.bench_tts,
+            "tts.cached": self.bench_tts_cached,
+            "silence": self.bench_silence,
+            "decode": self.bench_decode,
+            "fade": self.bench_fade,
+            "encode": self.bench_encode,
+        }
+        for assembly in sorted(gam.ASSEMBLERS):
+            items[f"herb.{assembly}"] = self.herb_bench(assembly, warm=True)
+            items[f"herb.{assembly}.cold"] = self.herb_bench(assembly, warm=False)
+        return items
+    
+    def settings(self) -> dict:
+        """影響量測結果的設定；與基準比較時必須完全相同（組合方式已包含在項目名稱中）"""
+        return {
+            "herbs": [herb['id'] for herb in self.herbs],
+            "jobs": self.jobs,
+            "tts_latency": self.tts_latency,
+            "tts_concurrency": gam.TTS_CONCURRENCY,
+        }
+
+
+# ============================================================================
+# 基準比較
+# ============================================================================
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ffmpeg": gam.ffmpeg_version(),
+        "numpy": gam.np.__version__ if gam.np is not None else None,
+    }
+
+
+def baseline_mismatches(baseline: dict, settings: dict) -> list:
+    """基準與本次執行不同的設定 [(名稱, 基準的值, 本次的值)]；基準格式版本不同時也列出"""
+    mismatches = []
+    if baseline.get("version") != BENCH_VERSION:
+        mismatches.append(("version", baseline.get("version"), BENCH_VERSION))
+    saved = baseline.get("settings", {})
+    for name, value in settings.items():
+        if saved.get(name) != value:
+            mismatches.append((name, saved.get(name), value))
+    return mismatches
+
+
+def compare(runs: list, baseline: dict, tolerance: float) -> list:
+    """回傳比基準慢超過 tolerance 的項目名稱"""
+    regressions = []
+    print(f"\n[COMPARE] 與基準比較（{baseline.get('created', '?')}，容許 {tolerance:.0%}）")
+    print(f"       {'benchmark':<20}{'baseline':>10}{'now':>10}{'change':>9}")
+    for run in runs:
+        base = baseline["results"].get(run.name)
+        if base is None:
+            print(f"       {run.name:<20}{'-':>10}{run.median:>10.3f}{'new':>9}")
+            continue
+        change = run.median / base["median"] - 1
+        mark = ""
+        if change > tolerance:
+            mark = "  [SLOWER]"
+            regressions.append(run.name)
+        elif change < -tolerance:
+            mark = "  [FASTER]"
+        print(f"       {run.name:<20}{base['median']:>10.3f}{run.median:>10.3f}{change:>+9.1%}{mark}")
+    return regressions
+
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+async def main():
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    
+    parser = argparse.ArgumentParser(description='冥想音檔生成流程效能測試')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='只執行指定項目')
+    parser.add_argument('--herbs', type=int, default=3, help='完整生成測試使用的草藥數量')
+    parser.add_argument('--repeat', type=int, default=3, help='每個項目重複次數（取中位數）')
+    parser.add_argument('--jobs', '-j', type=int, default=2, help='同時生成的草藥數量')
+    parser.add_argument('--tts-latency', type=float, default=0.0, help='模擬每次語音請求的延遲（秒）')
+    parser.add_argument('--save', type=Path, metavar='PATH', help='把結果存成基準檔')
+    parser.add_argument('--compare', type=Path, metavar='PATH', help='與基準檔比較')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='比基準慢超過此比例視為退步（預設 0.10）')
+    args = parser.parse_args()
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_meditations_"))
+    bench = Bench(work_dir, gam.HERBS_DATABASE[:max(1, args.herbs)], max(1, args.repeat),
+                  max(1, args.jobs), args.tts_latency)
+    items = bench.benchmarks()
+    if args.only:
+        unknown = [name for name in args.only if name not in items]
+        if unknown:
+            parser.error(f"未知的項目：{', '.join(unknown)}（可用：{', '.join(items)}）")
+        items = {name: items[name] for name in args.only}
+    
+    print("=" * 70)
+    print("[BENCH] 冥想音檔生成流程效能測試")
+    print("=" * 70)
+    print(f"\n草藥：{len(bench.herbs)} 個，不重複語句：{len(bench.lines)} 句，"
+          f"重複 {bench.repeat} 次，並行 {bench.jobs}，模擬延遲 {args.tts_latency} 秒")
+    print(f"ffmpeg：{gam.ffmpeg_version()}")
+    print(f"\n       {'benchmark':<20}{'median':>9}{'min':>9}  throughput")
+    
+    runs = []
+    try:
+        for name, bench_item in items.items():
+            run = await bench_item()
+            runs.append(run)
+            print(f"       {run.name:<20}{run.median:>9.3f}{min(run.seconds):>9.3f}  {run.throughput()}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    staged = [run for run in runs if run.stages]
+    if staged:
+        print("\n[STAGES] 完整生成的階段耗時（所有重複累計，並行區段會重疊）")
+        for run in staged:
+            breakdown = "，".join(f"{name} {spent:.2f}s×{count}" for name, count, spent in run.stages[:5])
+            print(f"       {run.name:<20}{breakdown}")
+    
+    if args.save:
+        data = {
+            "version": BENCH_VERSION,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "settings": {**bench.settings(), "repeat": bench.repeat},
+            "environment": environment(),
+            "results": {run.name: run.to_json() for run in runs},
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n[SAVE] 基準已寫入 {args.save}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        mismatches = baseline_mismatches(baseline, bench.settings())
+        if mismatches:
+            print(f"\n[X] 設定與基準不同，結果無法比較（請以相同的 --herbs、--jobs、--tts-latency 重新執行或重建基準）：")
+            for name, saved, current in mismatches:
+                print(f"       {name}：基準 {saved}，本次 {current}")
+            sys.exit(2)
+        if baseline.get("environment") != environment():
+            print("\n[WARN] 執行環境（Python、ffmpeg、numpy 或平台）與基準不同，差異可能來自環境")
+        regressions = compare(runs, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[WARN] {len(regressions)} 個項目比基準慢：{', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
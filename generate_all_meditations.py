@@ -8,8 +8,17 @@ TCM 正念日曆 - 54種草藥冥想音檔批量生成器
     py generate_all_meditations.py              # 生成所有54個音檔
     py generate_all_meditations.py --start 1 --end 10    # 只生成第1到第10個
     py generate_all_meditations.py --herb 薄荷           # 只生成特定草藥
+    py generate_all_meditations.py --jobs 4              # 同時生成4個草藥
+    py generate_all_meditations.py --season 冬           # 只生成冬季草藥
+    py generate_all_meditations.py --minutes 10,20       # 生成10分鐘與20分鐘的版本
+    py generate_all_meditations.py --plan                # 只估算工作量與時間，不合成
+    py generate_all_meditations.py --renditions opus,mp3 # 只輸出 Opus 與 MP3
+    py generate_all_meditations.py --shard 2/4           # 4台機器分工，這台負責第2份
+    py generate_all_meditations.py --merge s1 s2 s3 s4   # 合併各分片的輸出
 
-輸出：public/meditations/meditation_XX_herbname.mp3
+輸出：public/meditations/meditation_XX_herbname.mp3（另有 .opus、.m4a 版本）
+      public/meditations/meditation_XX_herbname_10min.mp3（--minutes 指定的長度）
+      public/meditations/renditions.json（各草藥可用的版本，供播放器挑選）
 ================================================================================
 """
 
@@ -17,16 +26,37 @@ import asyncio
 import subprocess
 import os
 import sys
+import json
+import random
+import shutil
+import hashlib
 import argparse
+import time
+import threading
+import importlib.metadata
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache, partial
+from contextlib import contextmanager, asynccontextmanager
+from bisect import bisect_right
+from itertools import chain
+from array import array
+from typing import NamedTuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape, unescape
+
+# edge-tts 只在真正連線合成時才載入（load_edge_tts），--plan 與離線後端不需要它
+edge_tts = None
+aiohttp = None
+edge_wire = None
 
 try:
-    import edge_tts
+    import numpy as np
 except ImportError:
-    print("正在安裝 edge-tts...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "edge-tts"])
-    import edge_tts
+    np = None  # 沒有 numpy 時以 array 逐樣本處理淡入淡出
+
+from herb_catalogue import SEASONS, load_catalogue
 
 
 # ============================================================================
@@ -36,250 +66,85 @@ except ImportError:
 VOICE = "zh-TW-HsiaoChenNeural"  # 台灣女聲
 RATE = "-15%"   # 語速
 PITCH = "-5Hz"  # 音調
+TTS_CONCURRENCY = 6  # 同時進行的語音合成請求上限（--tts-concurrency auto 時自動調整）
+TTS_AUTO_INITIAL = 4     # 自動調整：起始上限
+TTS_AUTO_MAX = 32        # 自動調整：上限的最大值
+TTS_LATENCY_TOLERANCE = 2.0  # 近期延遲超過長期平均的倍數時視為過載
+TTS_BATCH = 1        # 每次語音請求合併的腳本行數（1 表示逐行合成）
+CACHE_MAX_MB = 512    # 語音快取容量上限
+TONE_SEC_PER_CHAR = 0.25  # 離線替代後端：每個字的語音長度
+TONE_MIN_SEC = 0.5        # 離線替代後端：最短語音長度
+TTS_RETRIES = 4       # 單一語音請求失敗後的重試次數
+RETRY_BASE_DELAY = 1.0   # 第一次重試前的等待秒數，之後每次加倍
+RETRY_MAX_DELAY = 30.0   # 單次重試等待上限
+MAX_FAILURES = 5      # 失敗的草藥達到此數量時停止啟動新的草藥
+EDGE_SESSION_MAX_AGE = 300   # edge-tts 連線最長保留秒數，之後重新連線
+EDGE_SESSION_IDLE = 20       # 閒置超過此秒數的連線不再使用（伺服器可能已關閉）
+EDGE_SESSION_MAX_TURNS = 100 # 單一連線最多合成的次數
+EDGE_TTS_VERSION = "7.3.1"   # 測試過的 edge-tts 版本（與 requirements.txt 相同）；連線重用依賴它的內部函式
+SAMPLE_RATE = 24000   # edge-tts 輸出的取樣率
+ASSEMBLY = "graph"    # 組合方式：graph（ffmpeg filter graph）、pcm（記憶體內組合）或 stream（邊合成邊編碼）
+STREAM_LOOKAHEAD = 3  # stream 組合：正在寫入的句子之外，最多同時合成與解碼的句數（合併請求時為批數）
+STREAM_QUEUE_CHUNKS = 8  # stream 組合：每句最多先解出、等待寫入的 PCM 區塊數（每塊至多 64 KB）
+
+# 發佈版本：每個草藥先組合成一份無損母帶（FLAC），再並行編碼成以下格式。
+# 依偏好順序排列，播放器選第一個瀏覽器能播放的；MP3 一定會輸出，作為通用的備援。
+# 原始 MP3 平均約 27 kbps，因此 Opus、AAC 的位元率取在大小約為 MP3 一半處。
+RENDITIONS = {
+    "opus": {"ext": ".opus", "type": 'audio/ogg; codecs="opus"', "bitrate": 24,
+             "args": ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]},
+    "aac": {"ext": ".m4a", "type": 'audio/mp4; codecs="mp4a.40.2"', "bitrate": 32,
+            "args": ["-c:a", "aac", "-b:a", "32k", "-movflags", "+faststart"]},
+    "mp3": {"ext": ".mp3", "type": "audio/mpeg", "bitrate": None,
+            "args": ["-c:a", "libmp3lame", "-q:a", "2"]},
+}
+DEFAULT_RENDITIONS = ("opus", "aac", "mp3")
+MASTER_ARGS = ["-c:a", "flac", "-sample_fmt", "s16"]
 
 # 輸出目錄
 SCRIPT_DIR = Path(__file__).parent
 OUTPUT_DIR = SCRIPT_DIR / "public" / "meditations"
 TEMP_DIR = SCRIPT_DIR / "temp_meditation"
+CACHE_DIR = SCRIPT_DIR / ".tts_cache"
+MANIFEST_PATH = SCRIPT_DIR / "meditation_manifest.json"
+RENDITIONS_FILE = "renditions.json"  # 寫在 OUTPUT_DIR 中，前端依此挑選格式
+PLAN_SEC_PER_CHAR = 0.30     # 建置計畫：每個字的語音長度估計（依既有音檔量得）
+PLAN_FFMPEG_REALTIME = 150   # 建置計畫：解碼與編碼每秒可處理的音訊秒數
+PLAN_ENCODE_REALTIME = {"opus": 18, "aac": 160, "mp3": 260}  # 建置計畫：從母帶編碼各格式每秒可處理的音訊秒數
+TTS_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # 指標中語音請求延遲的分桶（秒）
+
+# 可選的冥想長度（分鐘）；省略時為標準腳本（約4.5分鐘）
+MEDITATION_LENGTHS = (3, 5, 10, 20)
+PAUSE_SCALE = (0.5, 2.0)   # 調整長度時引導句後停頓的縮放範圍
+SILENCE_MIN_SEC = 10       # 調整長度時靜默空間的最短秒數
+SILENCE_BLOCK_SEC = 60     # 靜默超過此秒數時分段，段間插入喚回專注的句子
+OPTIONAL_SECTIONS = ("嗅覺觀想", "視覺觀想")  # 時間不夠時依序省略的段落
+
+# 音檔組合流程有不相容的改動時遞增，讓所有草藥重新生成
+PIPELINE_VERSION = 2
 
 
 # ============================================================================
-# 54種草藥資料庫 - 包含觀想元素
+# 草藥資料庫 - 包含觀想元素
 # ============================================================================
 
-HERBS_DATABASE = [
-    # ===== 冬季養生 (1-14) =====
-    {"id": 1, "name": "人參", "pinyin": "renshen", "effect": "大補元氣", "season": "冬",
-     "visual": "人形般的根莖，帶著淡淡的金黃光澤",
-     "sensation": "溫暖的能量從丹田向全身擴散，如同冬日暖陽",
-     "aroma": "淡淡的泥土香與甘甜氣息"},
-    {"id": 2, "name": "黃耆", "pinyin": "huangqi", "effect": "補氣固表", "season": "冬",
-     "visual": "金黃色的根片，紋理細膩，散發溫暖光芒",
-     "sensation": "一股溫和的力量從體表向內滲透，穩固持久",
-     "aroma": "微甜的藥香，帶有一絲豆香"},
-    {"id": 3, "name": "黨參", "pinyin": "dangshen", "effect": "補中益氣", "season": "冬",
-     "visual": "質地柔韌的根條，表面有細密的紋理",
-     "sensation": "溫和的能量在脾胃緩緩流動，帶來滿足感",
-     "aroma": "甜美的藥香，如同秋收的穀物"},
-    {"id": 4, "name": "白朮", "pinyin": "baizhu", "effect": "健脾益氣", "season": "冬",
-     "visual": "乳白色的塊根，質地堅實，切面細膩",
-     "sensation": "脾胃區域感到溫暖踏實，消化系統輕盈",
-     "aroma": "清新的藥香，帶有一絲辛香"},
-    {"id": 5, "name": "茯苓", "pinyin": "fuling", "effect": "健脾寧心", "season": "冬",
-     "visual": "潔白如玉的塊狀，質地輕盈，如凝固的雲朵",
-     "sensation": "心神逐漸安定，如同湖水歸於平靜",
-     "aroma": "淡雅的松木香，帶有一絲甘甜"},
-    {"id": 6, "name": "山藥", "pinyin": "shanyao", "effect": "補脾養胃", "season": "冬",
-     "visual": "潔白細膩的切面，如同晨露中的白玉",
-     "sensation": "脾胃被溫柔地滋養，身體感到輕盈舒適",
-     "aroma": "清淡的澱粉香氣，帶有泥土的氣息"},
-    {"id": 7, "name": "甘草", "pinyin": "gancao", "effect": "調和諸藥", "season": "冬",
-     "visual": "金褐色的根條，纖維分明，質地堅韌",
-     "sensation": "一股和諧的能量調和全身，各處都變得平衡",
-     "aroma": "甜美的焦糖香，溫暖而親切"},
-    {"id": 8, "name": "大棗", "pinyin": "dazao", "effect": "補中益氣", "season": "冬",
-     "visual": "飽滿的深紅色果實，表面有細緻的皺紋",
-     "sensation": "甜美的能量滋養著身心，帶來溫暖與滿足",
-     "aroma": "濃郁的果香，甜美而溫馨"},
-    {"id": 9, "name": "紅棗", "pinyin": "hongzao", "effect": "養血安神", "season": "冬",
-     "visual": "溫潤的紅棕色，果肉飽滿，散發著生命力",
-     "sensation": "血液被溫柔地滋養，心神逐漸安定",
-     "aroma": "香甜的棗香，讓人感到安心"},
-    {"id": 10, "name": "蜂蜜", "pinyin": "fengmi", "effect": "補中潤燥", "season": "冬",
-     "visual": "晶瑩剔透的金黃色，緩緩流動，如同液態陽光",
-     "sensation": "甜美的能量潤澤五臟六腑，帶來深層滋養",
-     "aroma": "百花的芬芳，甜美而自然"},
-    {"id": 11, "name": "龍骨", "pinyin": "longgu", "effect": "鎮靜安神", "season": "冬",
-     "visual": "古老而沉穩的灰白色塊狀，帶著歲月的沉澱",
-     "sensation": "心神如大地般沉穩，雜念逐漸平息",
-     "aroma": "淡淡的礦物質氣息，古樸而安定"},
-    {"id": 12, "name": "牡蠣", "pinyin": "muli", "effect": "收斂固澀", "season": "冬",
-     "visual": "層層疊疊的貝殼，帶著海洋的神秘",
-     "sensation": "身體的能量被溫柔地收斂，如潮水歸於平靜",
-     "aroma": "淡淡的海洋氣息，清新而深遠"},
-    {"id": 13, "name": "磁石", "pinyin": "cishi", "effect": "鎮心安神", "season": "冬",
-     "visual": "深邃的黑色礦石，帶著神秘的磁性力量",
-     "sensation": "心神被穩穩地錨定，如同大地的引力",
-     "aroma": "清冽的礦石氣息，沉穩而有力"},
-    {"id": 14, "name": "琥珀", "pinyin": "hupo", "effect": "安神定志", "season": "冬",
-     "visual": "溫潤的金黃色，透明而溫暖，凝固了千年時光",
-     "sensation": "心志逐漸安定，思緒變得清明透徹",
-     "aroma": "淡淡的松香，帶著遠古的溫暖"},
-
-    # ===== 春季養生 (15-28) =====
-    {"id": 15, "name": "當歸", "pinyin": "danggui", "effect": "補血活血", "season": "春",
-     "visual": "深褐色的根莖，帶著生命的韌性與力量",
-     "sensation": "血液被溫柔地活化，循環變得順暢",
-     "aroma": "濃郁的藥香，帶有一絲辛甜"},
-    {"id": 16, "name": "白芍", "pinyin": "baishao", "effect": "養血柔肝", "season": "春",
-     "visual": "淡粉色的切面，質地細膩，如春日的花瓣",
-     "sensation": "肝氣被溫柔地舒緩，身心變得柔軟放鬆",
-     "aroma": "淡雅的花香，帶有一絲微酸"},
-    {"id": 17, "name": "川芎", "pinyin": "chuanxiong", "effect": "行氣活血", "season": "春",
-     "visual": "紋理交錯的根莖，蘊含著流動的能量",
-     "sensation": "氣血開始活絡流動，如同春水解凍",
-     "aroma": "清新的辛香，帶有一絲芹菜香"},
-    {"id": 18, "name": "丹參", "pinyin": "danshen", "effect": "活血養心", "season": "春",
-     "visual": "深紫紅色的根，如凝固的血液，蘊含生命力",
-     "sensation": "心臟區域感到溫暖，血脈通暢無阻",
-     "aroma": "淡淡的藥香，帶有一絲苦味"},
-    {"id": 19, "name": "紅花", "pinyin": "honghua", "effect": "活血祛瘀", "season": "春",
-     "visual": "艷麗的橙紅色花瓣，如同朝陽的光芒",
-     "sensation": "瘀滯的能量被溫柔地化開，循環恢復流暢",
-     "aroma": "獨特的花香，帶有一絲辛辣"},
-    {"id": 20, "name": "桃仁", "pinyin": "taoren", "effect": "活血祛瘀", "season": "春",
-     "visual": "扁平的種子，帶著桃花的記憶與春天的希望",
-     "sensation": "瘀血被輕柔地化解，新的能量開始流動",
-     "aroma": "淡淡的杏仁香，帶有一絲苦味"},
-    {"id": 21, "name": "益母草", "pinyin": "yimucao", "effect": "活血調經", "season": "春",
-     "visual": "翠綠的葉片，帶著母性般溫柔的力量",
-     "sensation": "氣血被溫柔地調和，身體節律恢復和諧",
-     "aroma": "青草的清香，帶有一絲苦味"},
-    {"id": 22, "name": "雞血藤", "pinyin": "jixueteng", "effect": "補血活絡", "season": "春",
-     "visual": "切面呈現紅褐色，如同流動的血液",
-     "sensation": "經絡逐漸通暢，四肢感到溫暖有力",
-     "aroma": "淡淡的木質香，帶有一絲甜味"},
-    {"id": 23, "name": "三七", "pinyin": "sanqi", "effect": "化瘀止血", "season": "春",
-     "visual": "質地堅實的塊根，蘊含強大的療癒力量",
-     "sensation": "身體的自癒能力被喚醒，創傷開始修復",
-     "aroma": "獨特的人參香，帶有一絲苦味"},
-    {"id": 24, "name": "延胡索", "pinyin": "yanhusuo", "effect": "活血止痛", "season": "春",
-     "visual": "金黃色的塊莖，如同凝固的陽光",
-     "sensation": "疼痛被溫柔地化解，身體逐漸放鬆",
-     "aroma": "淡淡的藥香，帶有一絲辛味"},
-    {"id": 25, "name": "鬱金", "pinyin": "yujin", "effect": "行氣解鬱", "season": "春",
-     "visual": "明亮的橙黃色，如同春日的陽光",
-     "sensation": "鬱悶的情緒被輕柔地疏解，心胸逐漸開闊",
-     "aroma": "清新的薑香，帶有一絲苦味"},
-    {"id": 26, "name": "薑黃", "pinyin": "jianghuang", "effect": "活血行氣", "season": "春",
-     "visual": "鮮豔的金黃色，充滿活力與能量",
-     "sensation": "氣血開始活躍流動，身體充滿活力",
-     "aroma": "溫暖的辛香，帶有一絲土地氣息"},
-    {"id": 27, "name": "香附", "pinyin": "xiangfu", "effect": "理氣解鬱", "season": "春",
-     "visual": "深褐色的塊莖，表面有著細密的紋理",
-     "sensation": "肝氣被溫柔地疏導，情緒逐漸平和",
-     "aroma": "特殊的香氣，帶有一絲辛甜"},
-    {"id": 28, "name": "枸杞", "pinyin": "gouqi", "effect": "滋補肝腎", "season": "春",
-     "visual": "飽滿的紅色果實，如同珍貴的紅寶石",
-     "sensation": "眼睛感到明亮，腰膝變得有力",
-     "aroma": "甜美的果香，溫暖而滋養"},
-
-    # ===== 夏季養生 (29-42) =====
-    {"id": 29, "name": "薄荷", "pinyin": "bohe", "effect": "疏散風熱", "season": "夏",
-     "visual": "翠綠的葉片在微風中輕輕搖曳，清新自然",
-     "sensation": "一股清涼從頭頂流向全身，暑熱消散",
-     "aroma": "清涼的薄荷香，提神醒腦"},
-    {"id": 30, "name": "菊花", "pinyin": "juhua", "effect": "清熱明目", "season": "夏",
-     "visual": "優雅的花瓣層層綻放，如同秋日的陽光",
-     "sensation": "眼睛感到清涼舒適，頭腦變得清明",
-     "aroma": "淡雅的花香，清新怡人"},
-    {"id": 31, "name": "艾草", "pinyin": "aicao", "effect": "溫經止血", "season": "夏",
-     "visual": "銀灰色的絨毛覆蓋著葉片，帶著古老智慧",
-     "sensation": "溫暖的能量在經絡中流動，驅散寒涼",
-     "aroma": "獨特的艾香，溫暖而安心"},
-    {"id": 32, "name": "茵陳", "pinyin": "yinchen", "effect": "清利濕熱", "season": "夏",
-     "visual": "纖細的莖葉，帶著春天的嫩綠",
-     "sensation": "體內的濕熱被清理，身體變得輕盈",
-     "aroma": "清新的青草香，帶有一絲苦味"},
-    {"id": 33, "name": "金錢草", "pinyin": "jinqiancao", "effect": "清熱利濕", "season": "夏",
-     "visual": "圓形的葉片如同小小的銅錢，排列整齊",
-     "sensation": "濕熱之邪被溫柔地排出體外",
-     "aroma": "淡淡的草香，清新自然"},
-    {"id": 34, "name": "車前草", "pinyin": "cheqiancao", "effect": "清熱利尿", "season": "夏",
-     "visual": "寬大的葉片貼地生長，質樸而堅韌",
-     "sensation": "體內的濁水被清理，身體變得清爽",
-     "aroma": "淡淡的青草香，帶有泥土氣息"},
-    {"id": 35, "name": "澤瀉", "pinyin": "zexie", "effect": "利水滲濕", "season": "夏",
-     "visual": "潔白的切面，如同水中的蓮藕",
-     "sensation": "多餘的水分被溫柔地疏導排出",
-     "aroma": "淡淡的清香，帶有一絲甜味"},
-    {"id": 36, "name": "滑石", "pinyin": "huashi", "effect": "清熱利濕", "season": "夏",
-     "visual": "細膩的白色粉末，如同夏日的清涼",
-     "sensation": "暑熱被清涼地化解，身體感到舒爽",
-     "aroma": "淡淡的礦物質氣息，清涼沁人"},
-    {"id": 37, "name": "通草", "pinyin": "tongcao", "effect": "清熱利水", "season": "夏",
-     "visual": "潔白輕盈的莖髓，如同凝固的泡沫",
-     "sensation": "水道通暢，濕熱得以疏導",
-     "aroma": "淡淡的清香，幾乎無味"},
-    {"id": 38, "name": "薏苡仁", "pinyin": "yiyiren", "effect": "健脾祛濕", "season": "夏",
-     "visual": "圓潤的乳白色種子，如同珍珠般飽滿",
-     "sensation": "脾胃被健壯，濕氣逐漸消散",
-     "aroma": "淡淡的穀物香，清新自然"},
-    {"id": 39, "name": "龍眼肉", "pinyin": "longyanrou", "effect": "養血安神", "season": "夏",
-     "visual": "飽滿的果肉，如同凝固的蜜糖",
-     "sensation": "心神被溫柔地滋養，感到安定與滿足",
-     "aroma": "甜美的果香，溫暖怡人"},
-    {"id": 40, "name": "酸棗仁", "pinyin": "suanzaoren", "effect": "安神助眠", "season": "夏",
-     "visual": "扁平的紅褐色種子，蘊含安眠的力量",
-     "sensation": "心神逐漸平靜，如同夜幕降臨",
-     "aroma": "淡淡的酸甜香，讓人放鬆"},
-    {"id": 41, "name": "遠志", "pinyin": "yuanzhi", "effect": "開心益智", "season": "夏",
-     "visual": "纖細的根條，蘊含著開啟智慧的力量",
-     "sensation": "心竅被輕柔地打開，思緒變得清明",
-     "aroma": "淡淡的藥香，帶有一絲苦味"},
-    {"id": 42, "name": "柏子仁", "pinyin": "baiziren", "effect": "養心安神", "season": "夏",
-     "visual": "油潤的種子，帶著松柏的常青力量",
-     "sensation": "心神被深層滋養，安穩而持久",
-     "aroma": "淡淡的松香，帶有油脂香"},
-
-    # ===== 秋季養生 (43-54) =====
-    {"id": 43, "name": "地黃", "pinyin": "dihuang", "effect": "滋陰養血", "season": "秋",
-     "visual": "深黑的根莖，蘊含大地深處的精華",
-     "sensation": "陰液被深層滋養，身體感到潤澤",
-     "aroma": "甜美的藥香，帶有一絲土地氣息"},
-    {"id": 44, "name": "阿膠", "pinyin": "ejiao", "effect": "補血滋陰", "season": "秋",
-     "visual": "烏黑發亮的膠塊，如同凝固的血液精華",
-     "sensation": "血液被深層滋養，肌膚變得潤澤",
-     "aroma": "獨特的膠香，帶有甜味"},
-    {"id": 45, "name": "何首烏", "pinyin": "heshouwu", "effect": "補肝腎益精血", "season": "秋",
-     "visual": "紅褐色的塊根，帶著返老還童的傳說",
-     "sensation": "肝腎被滋補，精氣神逐漸充盈",
-     "aroma": "淡淡的藥香，帶有苦澀"},
-    {"id": 46, "name": "桑椹", "pinyin": "sangshen", "effect": "滋陰補血", "season": "秋",
-     "visual": "飽滿的紫黑色果實，如同夜空中的寶石",
-     "sensation": "陰血被滋潤，口乾舌燥逐漸消退",
-     "aroma": "甜美的果香，帶有一絲酸味"},
-    {"id": 47, "name": "合歡皮", "pinyin": "hehuanpi", "effect": "解鬱安神", "season": "秋",
-     "visual": "棕褐色的樹皮，帶著和諧與歡樂的祝福",
-     "sensation": "憂鬱的情緒被輕柔地化解，心情逐漸開朗",
-     "aroma": "淡淡的木質香，帶有一絲甜味"},
-    {"id": 48, "name": "夜交藤", "pinyin": "yejiaoteng", "effect": "養血安神", "season": "秋",
-     "visual": "纏繞的藤蔓，如同夜晚交織的夢境",
-     "sensation": "心血被滋養，夜晚的睡眠變得安穩",
-     "aroma": "淡淡的藤香，帶有一絲甘甜"},
-    {"id": 49, "name": "珍珠母", "pinyin": "zhenzumu", "effect": "安神定驚", "season": "秋",
-     "visual": "閃爍著珍珠光澤的貝殼，帶著海洋的寧靜",
-     "sensation": "驚悸的心神被安撫，如同大海歸於平靜",
-     "aroma": "淡淡的海洋氣息，清新而安定"},
-    {"id": 50, "name": "陳皮", "pinyin": "chenpi", "effect": "理氣健脾", "season": "秋",
-     "visual": "棕褐色的果皮，帶著歲月沉澱的芬芳",
-     "sensation": "脾胃之氣被溫柔地理順，消化變得順暢",
-     "aroma": "芬芳的柑橘香，帶有一絲苦辛"},
-    {"id": 51, "name": "青皮", "pinyin": "qingpi", "effect": "疏肝破氣", "season": "秋",
-     "visual": "青綠色的果皮，帶著年輕的活力",
-     "sensation": "肝氣鬱結被疏通，胸悶逐漸消散",
-     "aroma": "清新的柑橘香，帶有一絲辛烈"},
-    {"id": 52, "name": "枳實", "pinyin": "zhishi", "effect": "破氣消積", "season": "秋",
-     "visual": "青綠色的幼果，蘊含強大的破滯力量",
-     "sensation": "積滯被化解，腹脹逐漸消退",
-     "aroma": "強烈的柑橘香，帶有苦味"},
-    {"id": 53, "name": "木香", "pinyin": "muxiang", "effect": "行氣止痛", "season": "秋",
-     "visual": "棕色的根片，散發著獨特的香氣",
-     "sensation": "氣機流暢，腹部的不適逐漸緩解",
-     "aroma": "濃郁的木質香，帶有一絲辛辣"},
-    {"id": 54, "name": "烏藥", "pinyin": "wuyao", "effect": "順氣止痛", "season": "秋",
-     "visual": "黑褐色的根莖，質地堅韌有力",
-     "sensation": "寒凝之氣被溫暖地化解，疼痛逐漸消退",
-     "aroma": "獨特的藥香，帶有一絲辛溫"},
-]
+# 草藥資料存放在 src/data/herbs.json（前端共用）與 herb_narration.json（觀想引導文字），
+# 由 herb_catalogue 合併並建立索引；這裡只取有觀想引導文字、可以生成冥想音檔的草藥
+CATALOGUE = load_catalogue().with_meditation()
+HERBS_DATABASE = CATALOGUE.herbs
 
 
 # ============================================================================
 # 冥想腳本生成器
 # ============================================================================
 
-def generate_meditation_script(herb):
-    """根據草藥資料生成個性化的冥想腳本"""
+def generate_meditation_script(herb, minutes: int = None, durations: dict = None):
+    """根據草藥資料生成個性化的冥想腳本
+    
+    minutes 省略時為標準長度（約4.5分鐘）；指定時由 fit_script 調整成約 minutes 分鐘，
+    只重複使用標準腳本中的句子，已合成過的語音片段都能沿用。durations 為各句的
+    實際語音長度 {句子: 秒}（見 TTSClient.durations），沒有的句子依字數估計。
+    """
     
     season_greetings = {
         "春": "春風輕拂，萬物復甦。",
@@ -295,249 +160,2226 @@ def generate_meditation_script(herb):
         "冬": "帶著冬日的溫暖與沉穩"
     }
     
-    script = [
-        # === 開場引導 ===
-        (f"歡迎來到這段{herb['name']}觀想冥想。", 2),
-        ("找一個舒適的姿勢，輕輕閉上眼睛。", 3),
-        ("讓呼吸自然流動，不需要刻意控制。", 4),
-        (season_greetings[herb['season']], 3),
-        ("現在，讓我們一起走進一座寧靜的草藥園。", 4),
+    sections = {
+        "開場引導": [
+            (f"歡迎來到這段{herb['name']}觀想冥想。", 2),
+            ("找一個舒適的姿勢，輕輕閉上眼睛。", 3),
+            ("讓呼吸自然流動，不需要刻意控制。", 4),
+            (season_greetings[herb['season']], 3),
+            ("現在，讓我們一起走進一座寧靜的草藥園。", 4),
+        ],
+        "進入觀想": [
+            (f"想像你來到一處{herb['name']}的生長之地。", 3),
+            ("陽光溫柔地灑落，微風輕輕吹過。", 4),
+            (f"眼前是珍貴的{herb['name']}，靜靜地等待著你。", 4),
+        ],
+        "視覺觀想": [
+            ("走近一些，仔細觀察它的樣貌。", 3),
+            (f"你看見{herb['visual']}。", 5),
+            ("在光線下，它散發著生命的光彩。", 4),
+            ("這是大自然賜予我們的珍貴禮物。", 4),
+        ],
+        "嗅覺觀想": [
+            ("現在，輕輕靠近，感受它的氣息。", 3),
+            (f"一股{herb['aroma']}緩緩升起。", 4),
+            ("吸氣，讓這份香氣進入你的身體。", 4),
+            ("感覺這股氣息隨著呼吸，流入全身。", 5),
+        ],
+        "身體感受與功效觀想": [
+            (f"{herb['name']}的主要功效是{herb['effect']}。", 4),
+            (f"想像這份能量正在你的體內流動。", 3),
+            (f"{herb['sensation']}。", 6),
+            ("讓這份能量持續滋養你的身心。", 5),
+            ("每一次呼吸，都在加深這份連結。", 5),
+        ],
+        "靜默空間": [
+            ("現在，安靜地停留在這份感受中。", 3),
+            ("讓身體自然地吸收這份療癒能量。", 3),
+            ("", 20),
+        ],
+        "結束引導": [
+            (f"慢慢地，讓{herb['name']}的影像淡去。", 4),
+            ("但那份滋養的感覺，會留在你的身體裡。", 4),
+            ("感覺你的呼吸，感覺此刻的寧靜。", 4),
+            ("輕輕動一動手指和腳趾。", 3),
+            ("準備好的時候，慢慢睜開眼睛。", 4),
+            (f"{season_closings[herb['season']]}，繼續你的一天。", 5),
+        ],
+    }
+    
+    if minutes is None:
+        return list(chain.from_iterable(sections.values()))
+    
+    # 長時間靜默中用來喚回專注的句子，都是上面已有的句子
+    cues = [
+        "每一次呼吸，都在加深這份連結。",
+        f"{herb['sensation']}。",
+        "感覺你的呼吸，感覺此刻的寧靜。",
+        "讓這份能量持續滋養你的身心。",
+    ]
+    return fit_script(sections, cues, minutes * 60, durations)
+
+
+def speech_lines(herb: dict) -> list:
+    """標準腳本中需要合成的句子；調整長度後的腳本也只會用到這些句子"""
+    return [text for text, _ in generate_meditation_script(herb) if text.strip()]
+
+
+def estimated_speech_sec(text: str) -> float:
+    return len(text) * PLAN_SEC_PER_CHAR
+
+
+def fit_script(sections: dict, cues: list, target_sec: float, durations: dict = None) -> list:
+    """把分段的標準腳本調整成約 target_sec 秒
+    
+    引導句後的停頓依同一比例縮放（限制在 PAUSE_SCALE 範圍內），其餘時間交給
+    靜默；靜默超過 SILENCE_BLOCK_SEC 時分成數段，段與段之間輪流插入 cues。
+    縮到最短仍太長時，依 OPTIONAL_SECTIONS 的順序省略段落。
+    語音長度取自 durations（已合成句子的實際長度），其餘句子以每字秒數估計。
+    """
+    durations = durations or {}
+    speech_sec = lambda text: durations.get(text) or estimated_speech_sec(text)
+    low, high = PAUSE_SCALE
+    for dropped in range(len(OPTIONAL_SECTIONS) + 1):
+        kept = {name: lines for name, lines in sections.items() if name not in OPTIONAL_SECTIONS[:dropped]}
+        lines = list(chain.from_iterable(kept.values()))
+        speech = sum(speech_sec(text) for text, _ in lines if text)
+        pauses = sum(pause for text, pause in lines if text)
+        silences = sum(pause for text, pause in lines if not text)
+        # 停頓與靜默先依標準腳本的比例分配剩餘時間
+        free = target_sec - speech
+        scale = min(high, free / (pauses + silences))
+        if free - pauses * scale < SILENCE_MIN_SEC:
+            scale = (free - SILENCE_MIN_SEC) / pauses
+        if scale >= low:
+            break
+    scale = max(low, scale)
+    
+    # 每個靜默依原本的比例分到剩餘時間，過長時插入喚回專注的句子
+    silence_total = max(SILENCE_MIN_SEC, free - pauses * scale)
+    script = []
+    cue_index = 0
+    for text, pause in lines:
+        if text:
+            script.append((text, round(pause * scale, 2)))
+            continue
+        remaining = silence_total * pause / silences
+        inserted = []
+        while remaining / (len(inserted) + 1) > SILENCE_BLOCK_SEC:
+            cue = cues[cue_index % len(cues)]
+            cue_index += 1
+            inserted.append(cue)
+            remaining -= speech_sec(cue)
+        block = round(remaining / (len(inserted) + 1), 2)
+        script.append(("", block))
+        for cue in inserted:
+            script.append((cue, 0))
+            script.append(("", block))
+    return script
+
+
+# ============================================================================
+# 效能追蹤
+# ============================================================================
+
+class Tracer:
+    """記錄各階段的耗時區段（span），匯出 Chrome/Perfetto trace-event JSON 並彙整統計
+    
+    區段依所在的 asyncio task（或執行緒）分軌，同一軌內的區段必然巢狀，
+    在 chrome://tracing 或 ui.perfetto.dev 中可直接看出並行與等待。
+    """
+    
+    def __init__(self):
+        self.spans = []
+        self.tracks = {}
+        self._origin = time.perf_counter()
+    
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            key, label = id(task), task.get_name()
+        else:
+            key, label = threading.get_ident(), threading.current_thread().name
+        if key not in self.tracks:
+            self.tracks[key] = (len(self.tracks) + 1, label)
+        return self.tracks[key][0]
+    
+    @contextmanager
+    def span(self, name: str, **args):
+        """記錄 with 區塊的耗時；args 會附在 trace 事件上"""
+        track = self._track()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, track, start, time.perf_counter(), args))
+    
+    def write(self, path: Path):
+        """輸出 trace-event JSON（時間單位為微秒）"""
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": label}}
+            for tid, label in self.tracks.values()
+        ]
+        for name, track, start, end, args in self.spans:
+            events.append({
+                "name": name, "cat": name.split(".")[0], "ph": "X", "pid": 1, "tid": track,
+                "ts": round((start - self._origin) * 1e6), "dur": round((end - start) * 1e6),
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    
+    def summary(self) -> list:
+        """各階段的 (名稱, 次數, p50, p95, 累計秒數)，依累計時間排序"""
+        durations = {}
+        for name, _, start, end, _ in self.spans:
+            durations.setdefault(name, []).append(end - start)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rank = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+            rows.append((name, len(values), rank(0.50), rank(0.95), sum(values)))
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+
+class NullTracer(Tracer):
+    """不記錄任何區段的 Tracer：常駐程式不輸出 trace，記錄的區段只會無限累積"""
+    
+    @contextmanager
+    def span(self, name: str, **args):
+        yield
+
+
+TRACER = Tracer()
+
+
+# ============================================================================
+# 音頻生成功能
+# ============================================================================
+
+class SpeechAudio(NamedTuple):
+    """一段合成語音：MP3 資料與實際長度（秒）"""
+    data: bytes
+    duration: float
+
+
+class TTSBackend:
+    """語音合成後端介面
+    
+    子類別實作 synthesize()，回傳 24kHz 單聲道 MP3；version 會納入快取鍵與
+    建置雜湊，後端輸出有變化時必須跟著改變。
+    """
+    
+    name = ""
+    version = ""
+    expected_latency = 1.0  # 建置計畫用的單次請求耗時估計（秒）
+    
+    async def synthesize(self, text: str, voice: str, rate: str, pitch: str) -> SpeechAudio:
+        raise NotImplementedError
+    
+    async def stream(self, text: str, voice: str, rate: str, pitch: str):
+        """逐塊產生 MP3 資料；預設整段合成完才一次輸出，可串流的後端應覆寫"""
+        audio = await self.synthesize(text, voice, rate, pitch)
+        yield audio.data
+    
+    async def synthesize_marked(self, text: str, voice: str, rate: str, pitch: str):
+        """合成並回傳 (SpeechAudio, 邊界清單)，邊界為 (開始秒, 長度秒, 文字)
+        
+        多行合併成一次請求時用來找出每行的位置；不支援的後端不實作。
+        """
+        raise NotImplementedError(f"{self.name} 後端不提供斷詞時間")
+    
+    async def close(self):
+        """釋放後端保留的連線等資源"""
+
+
+# EdgeSession 使用的 edge_tts.communicate 內部名稱，不屬於公開 API，改版時可能改變
+EDGE_WIRE_NAMES = (
+    "WSS_URL", "WSS_HEADERS", "SEC_MS_GEC_VERSION", "DRM", "_SSL_CTX", "TTSConfig", "connect_id",
+    "date_to_string", "mkssml", "ssml_headers_plus_data", "split_text_by_byte_length",
+    "remove_incompatible_characters", "get_headers_and_data",
+)
+
+
+def load_edge_tts():
+    """載入 edge-tts，未安裝時先自動安裝測試過的版本
+    
+    已安裝的正是 EDGE_TTS_VERSION 且內部函式都在時才設定 edge_wire，由 EdgeSession
+    重用連線；否則 edge_wire 維持 None，合成改走公開的 edge_tts.Communicate。
+    """
+    global edge_tts, aiohttp, edge_wire
+    if edge_tts is None:
+        try:
+            import edge_tts as module
+        except ImportError:
+            print(f"正在安裝 edge-tts {EDGE_TTS_VERSION}...")
+            subprocess.check_call([sys.executable, "-m", "pip", "install", f"edge-tts=={EDGE_TTS_VERSION}"])
+            import edge_tts as module
+        import aiohttp as http  # edge-tts 的相依套件
+        edge_tts, aiohttp = module, http
+        
+        version = package_version("edge-tts")
+        try:
+            from edge_tts import communicate as wire
+            compatible = all(hasattr(wire, name) for name in EDGE_WIRE_NAMES)
+        except ImportError:
+            compatible = False
+        if version == EDGE_TTS_VERSION and compatible:
+            edge_wire = wire
+        else:
+            print(f"[WARN] edge-tts {version} 不是測試過的 {EDGE_TTS_VERSION}，"
+                  f"改用 edge_tts.Communicate（每次請求重新連線）")
+    return edge_tts
+
+
+def package_version(name: str) -> str:
+    """已安裝套件的版本（只讀套件資訊，不匯入套件）"""
+    try:
+        return importlib.metadata.version(name)
+    except importlib.metadata.PackageNotFoundError:
+        return "missing"
+
+
+class EdgeSession:
+    """一條保持開啟的 edge-tts websocket 連線，可依序進行多輪合成
+    
+    edge_tts.Communicate 每次合成都重新連線並重做 TLS 握手；這裡沿用它的
+    協定格式（edge_wire 中的 SSML 與標頭函式），但在同一條連線上連續送出請求。
+    """
+    
+    def __init__(self):
+        self.http = None
+        self.ws = None
+        self.opened_at = 0.0
+        self.last_used = 0.0
+        self.turns = 0
+        self.busy = False
+        self._boundary = None
+    
+    async def connect(self):
+        load_edge_tts()
+        timeout = aiohttp.ClientTimeout(total=None, connect=None, sock_connect=10, sock_read=60)
+        self.http = aiohttp.ClientSession(trust_env=True, timeout=timeout)
+        try:
+            self.ws = await self.http.ws_connect(
+                f"{edge_wire.WSS_URL}&ConnectionId={edge_wire.connect_id()}"
+                f"&Sec-MS-GEC={edge_wire.DRM.generate_sec_ms_gec()}"
+                f"&Sec-MS-GEC-Version={edge_wire.SEC_MS_GEC_VERSION}",
+                compress=15,
+                headers=edge_wire.DRM.headers_with_muid(edge_wire.WSS_HEADERS),
+                ssl=edge_wire._SSL_CTX)
+        except aiohttp.ClientResponseError as e:
+            await self.close()
+            if e.status == 403:
+                # 本機時鐘偏差會讓簽章失效；校正後由呼叫端重試
+                edge_wire.DRM.handle_client_response_error(e)
+            raise
+        except BaseException:
+            await self.close()
+            raise
+        self.opened_at = self.last_used = time.monotonic()
+    
+    def healthy(self) -> bool:
+        now = time.monotonic()
+        return (self.ws is not None and not self.ws.closed and not self.busy
+                and now - self.opened_at < EDGE_SESSION_MAX_AGE
+                and now - self.last_used < EDGE_SESSION_IDLE
+                and self.turns < EDGE_SESSION_MAX_TURNS)
+    
+    async def _send_config(self, boundary: str):
+        word = "true" if boundary == "WordBoundary" else "false"
+        sentence = "false" if boundary == "WordBoundary" else "true"
+        await self.ws.send_str(
+            f"X-Timestamp:{edge_wire.date_to_string()}\r\n"
+            "Content-Type:application/json; charset=utf-8\r\n"
+            "Path:speech.config\r\n\r\n"
+            '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+            f'"sentenceBoundaryEnabled":"{sentence}","wordBoundaryEnabled":"{word}"'
+            '},"outputFormat":"audio-24khz-48kbitrate-mono-mp3"}}}}\r\n')
+        self._boundary = boundary
+    
+    async def turn(self, text: str, voice: str, rate: str, pitch: str, boundary: str):
+        """合成一段文字，依序產生與 Communicate.stream() 相同格式的區塊"""
+        self.busy = True
+        if self._boundary != boundary:
+            await self._send_config(boundary)
+        config = edge_wire.TTSConfig(voice, rate, "+0%", pitch, boundary)
+        parts = edge_wire.split_text_by_byte_length(
+            escape(edge_wire.remove_incompatible_characters(text)), 4096)
+        
+        # 長文字分成多次請求，後面各段的時間要加上前面音訊的長度（48kbps CBR）
+        offset_ticks = 0
+        for part in parts:
+            await self.ws.send_str(edge_wire.ssml_headers_plus_data(
+                edge_wire.connect_id(), edge_wire.date_to_string(), edge_wire.mkssml(config, part)))
+            audio_bytes = 0
+            async for message in self.ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    encoded = message.data.encode("utf-8")
+                    headers, data = edge_wire.get_headers_and_data(encoded, encoded.find(b"\r\n\r\n"))
+                    path = headers.get(b"Path")
+                    if path == b"audio.metadata":
+                        for meta in json.loads(data)["Metadata"]:
+                            if meta["Type"] in ("WordBoundary", "SentenceBoundary"):
+                                yield {
+                                    "type": meta["Type"],
+                                    "offset": meta["Data"]["Offset"] + offset_ticks,
+                                    "duration": meta["Data"]["Duration"],
+                                    "text": unescape(meta["Data"]["text"]["Text"]),
+                                }
+                    elif path == b"turn.end":
+                        break
+                elif message.type == aiohttp.WSMsgType.BINARY:
+                    header_length = int.from_bytes(message.data[:2], "big")
+                    _, data = edge_wire.get_headers_and_data(message.data, header_length)
+                    if data:
+                        audio_bytes += len(data)
+                        yield {"type": "audio", "data": data}
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    raise ConnectionError(f"edge-tts 連線錯誤：{message.data}")
+            else:
+                raise ConnectionError("edge-tts 連線在合成途中關閉")
+            if not audio_bytes:
+                raise edge_tts.exceptions.NoAudioReceived("沒有收到語音資料")
+            offset_ticks += audio_bytes * 8 * 10_000_000 // 48_000
+        
+        self.turns += 1
+        self.last_used = time.monotonic()
+        self.busy = False
+    
+    async def close(self):
+        try:
+            if self.ws is not None:
+                await self.ws.close()
+        finally:
+            if self.http is not None:
+                await self.http.close()
+
+
+class EdgeSessionPool:
+    """保留閒置的 edge-tts 連線供下一次合成使用，省去重複的連線與 TLS 握手
+    
+    取用前檢查連線是否仍可用（未關閉、未超過存活與閒置時間），合成途中失敗
+    的連線直接丟棄，下次取用時重新連線。同時開啟的連線數由 TTSClient 的並行
+    上限決定。服務若不接受同一連線上的第二次合成，就退回每次請求一條新連線。
+    """
+    
+    def __init__(self):
+        self._idle = []
+        self.reuse = True
+        self.opened = 0
+        self.reused = 0
+        self._reuse_failures = 0
+    
+    async def acquire(self) -> EdgeSession:
+        while self._idle:
+            # 最近用過的連線最可能仍然開著
+            session = self._idle.pop()
+            if session.healthy():
+                self.reused += 1
+                return session
+            await session.close()
+        session = EdgeSession()
+        await session.connect()
+        self.opened += 1
+        return session
+    
+    async def release(self, session: EdgeSession):
+        if self.reuse and session.healthy():
+            self._idle.append(session)
+        else:
+            await session.close()
+    
+    async def reuse_failed(self):
+        """重用的連線在收到任何資料前就失敗；累計兩次就停止重用"""
+        self._reuse_failures += 1
+        if self._reuse_failures >= 2 and self.reuse:
+            self.reuse = False
+            await self.close()
+    
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+
+class EdgeTTSBackend(TTSBackend):
+    """微軟 Edge 線上語音合成（edge-tts），透過連線池重用 websocket 連線"""
+    
+    name = "edge"
+    version = f"edge-tts/{package_version('edge-tts')}"
+    expected_latency = 1.5
+    
+    def __init__(self):
+        self.pool = EdgeSessionPool()
+    
+    async def _chunks(self, text, voice, rate, pitch, boundary="SentenceBoundary"):
+        load_edge_tts()
+        if edge_wire is None:
+            # 未測試的 edge-tts 版本：用公開 API，輸出的區塊格式相同
+            communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch, boundary=boundary)
+            async for chunk in communicate.stream():
+                yield chunk
+            return
+        session = await self.pool.acquire()
+        reused = session.turns > 0
+        received = False
+        try:
+            async for chunk in session.turn(text, voice, rate, pitch, boundary):
+                received = True
+                yield chunk
+        except Exception:
+            if reused and not received:
+                await self.pool.reuse_failed()
+            raise
+        finally:
+            await self.pool.release(session)
+    
+    async def synthesize(self, text, voice, rate, pitch):
+        chunks = [chunk async for chunk in self.stream(text, voice, rate, pitch)]
+        data = b"".join(chunks)
+        return SpeechAudio(data, mp3_duration(data))
+    
+    async def stream(self, text, voice, rate, pitch):
+        async for chunk in self._chunks(text, voice, rate, pitch):
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+    
+    async def synthesize_marked(self, text, voice, rate, pitch):
+        chunks = []
+        boundaries = []
+        async for chunk in self._chunks(text, voice, rate, pitch, boundary="WordBoundary"):
+            if chunk["type"] == "audio":
+                chunks.append(chunk["data"])
+            elif chunk["type"] in ("WordBoundary", "SentenceBoundary"):
+                # edge-tts 的時間單位是 100 奈秒
+                boundaries.append((chunk["offset"] / 1e7, chunk["duration"] / 1e7, chunk["text"]))
+        data = b"".join(chunks)
+        return SpeechAudio(data, mp3_duration(data)), boundaries
+    
+    async def close(self):
+        await self.pool.close()
+
+
+class ToneBackend(TTSBackend):
+    """離線、可重現的替代後端：依文字長度產生固定音高的正弦音
+    
+    輸出格式與 edge-tts 相同（24kHz 單聲道 48kbps MP3），用於測量流程效能
+    與在沒有網路的 CI 環境中建置；latency 可模擬網路往返時間。
+    """
+    
+    name = "tone"
+    version = "tone/1"
+    
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.expected_latency = 0.1 + latency
+    
+    @staticmethod
+    def tone_for(text: str, voice: str, rate: str, pitch: str):
+        """由輸入決定音高與長度，相同輸入永遠得到相同結果"""
+        digest = hashlib.sha256(f"{voice}|{rate}|{pitch}|{text}".encode("utf-8")).digest()
+        frequency = 220 + int.from_bytes(digest[:2], "big") % 440
+        duration = max(TONE_MIN_SEC, len(text) * TONE_SEC_PER_CHAR)
+        return frequency, duration
+    
+    def _render(self, frequency: int, duration: float) -> bytes:
+        cmd = [
+            "ffmpeg", "-v", "error", "-f", "lavfi",
+            "-i", f"sine=frequency={frequency}:sample_rate={SAMPLE_RATE}:duration={duration}",
+            "-ac", "1", "-c:a", "libmp3lame", "-b:a", "48k",
+            "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3", "pipe:1"
+        ]
+        with TRACER.span("ffmpeg.tone"):
+            result = subprocess.run(cmd, capture_output=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"無法產生替代語音：{result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+    
+    async def synthesize(self, text, voice, rate, pitch):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        frequency, duration = self.tone_for(text, voice, rate, pitch)
+        data = await asyncio.to_thread(self._render, frequency, duration)
+        return SpeechAudio(data, mp3_duration(data))
+    
+    async def synthesize_marked(self, text, voice, rate, pitch):
+        # 每行依字數佔一段時間，換行字元當作行與行之間的停頓
+        audio = await self.synthesize(text, voice, rate, pitch)
+        boundaries = []
+        position = 0
+        for line in text.split("\n"):
+            if line:
+                boundaries.append((position * TONE_SEC_PER_CHAR, len(line) * TONE_SEC_PER_CHAR, line))
+            position += len(line) + 1
+        return audio, boundaries
+
+
+TTS_BACKENDS = {
+    "edge": EdgeTTSBackend,
+    "tone": ToneBackend,
+}
+
+
+class TTSCache:
+    """以內容雜湊為鍵的語音片段磁碟快取，超過容量時淘汰最久未使用的片段
+    
+    鍵由 (文字, 語音, 語速, 音調, 後端版本) 計算，任何一項改變都會視為新片段。
+    目錄在第一次寫入時才建立，只查詢快取（例如 --plan）不會留下空目錄。
+    """
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
         
-        # === 進入觀想 ===
-        (f"想像你來到一處{herb['name']}的生長之地。", 3),
-        ("陽光溫柔地灑落，微風輕輕吹過。", 4),
-        (f"眼前是珍貴的{herb['name']}，靜靜地等待著你。", 4),
+        # 依最後使用時間排序（舊 → 新），作為 LRU 淘汰順序
+        entries = []
+        for f in self.cache_dir.glob("??/*.mp3"):
+            stat = f.stat()
+            entries.append((stat.st_mtime, f.stem, stat.st_size))
+        entries.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._entries.values())
+    
+    @staticmethod
+    def key(text: str, voice: str, rate: str, pitch: str, backend_version: str) -> str:
+        payload = json.dumps([text, voice, rate, pitch, backend_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.mp3"
+    
+    def __contains__(self, key: str) -> bool:
+        # 只查索引，不更新使用時間也不計入命中率
+        return key in self._entries
+    
+    def get(self, key: str):
+        """回傳快取的 MP3 資料；未命中時回傳 None"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            # 快取檔被外部刪除
+            self._total -= self._entries.pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+    
+    def get_meta(self, key: str):
+        """回傳與片段一起存放的附加資料（例如斷句時間）；沒有時回傳 None"""
+        try:
+            with open(self.path(key).with_suffix(".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def put(self, key: str, data: bytes, meta: dict = None):
+        """寫入快取（可附帶 meta），必要時淘汰舊片段"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if meta is not None:
+            # 附加資料先寫，讓音檔出現時附加資料一定已經存在
+            meta_file = path.with_suffix(f".{os.getpid()}.json.part")
+            meta_file.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            os.replace(meta_file, path.with_suffix(".json"))
+        part_file = path.with_suffix(f".{os.getpid()}.part")
+        part_file.write_bytes(data)
+        os.replace(part_file, path)
         
-        # === 視覺觀想 ===
-        ("走近一些，仔細觀察它的樣貌。", 3),
-        (f"你看見{herb['visual']}。", 5),
-        ("在光線下，它散發著生命的光彩。", 4),
-        ("這是大自然賜予我們的珍貴禮物。", 4),
+        self._total += len(data) - self._entries.pop(key, 0)
+        self._entries[key] = len(data)
         
-        # === 嗅覺觀想 ===
-        ("現在，輕輕靠近，感受它的氣息。", 3),
-        (f"一股{herb['aroma']}緩緩升起。", 4),
-        ("吸氣，讓這份香氣進入你的身體。", 4),
-        ("感覺這股氣息隨著呼吸，流入全身。", 5),
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._total -= old_size
+            self.path(old_key).unlink(missing_ok=True)
+            self.path(old_key).with_suffix(".json").unlink(missing_ok=True)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """後端限流或逾時：應降低並行數的錯誤"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    return getattr(error, "status", None) in (429, 503)
+
+
+class AdaptiveLimiter:
+    """AIMD 並行上限：請求順利時逐步放寬，遇到限流、逾時或延遲明顯變長時減半
+    
+    以 async with limiter.slot() 取得名額，離開時依結果與耗時調整上限。
+    每次成功把上限加 1/limit（約每一輪加一），每段延遲時間內最多減半一次，
+    避免同一波失敗把上限一路壓到底。limit、in_flight 與 latency 供顯示與監控。
+    """
+    
+    def __init__(self, initial: int = TTS_AUTO_INITIAL, minimum: int = 1, maximum: int = TTS_AUTO_MAX):
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.peak = self.limit
+        self.decreases = 0
+        self.latency = None   # 近期延遲（秒，指數移動平均）
+        self.baseline = None  # 長期延遲，作為比較基準
+        self._last_decrease = 0.0
+        self._waiters = []
+    
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """取得一個名額，離開時歸還並依結果調整上限
         
-        # === 身體感受與功效觀想 ===
-        (f"{herb['name']}的主要功效是{herb['effect']}。", 4),
-        (f"想像這份能量正在你的體內流動。", 3),
-        (f"{herb['sensation']}。", 6),
-        ("讓這份能量持續滋養你的身心。", 5),
-        ("每一次呼吸，都在加深這份連結。", 5),
+        開始時間記在這次取得本身，不依 task 區分：在 async generator 中跨 yield
+        持有、最後由其他 task 結束（例如未 aclose 的 generator 被回收）也能正確歸還。
+        """
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(waiter)
+        self.in_flight += 1
+        start = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.in_flight -= 1
+            if error is None:
+                self._observe(time.monotonic() - start)
+            elif is_throttled(error):
+                self._decrease()
+            self._wake()
+    
+    def _observe(self, elapsed: float):
+        if self.latency is None:
+            self.latency = self.baseline = elapsed
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * elapsed
+            self.baseline = 0.98 * self.baseline + 0.02 * elapsed
+        if self.latency > self.baseline * TTS_LATENCY_TOLERANCE:
+            self._decrease()
+        else:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self.peak = max(self.peak, self.limit)
+    
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 0):
+            return
+        self._last_decrease = now
+        self._limit = max(self.minimum, self._limit / 2)
+        self.decreases += 1
+    
+    def _wake(self):
+        free = self.limit - self.in_flight
+        for waiter in self._waiters:
+            if free <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class StreamAbandoned(Exception):
+    """負責合成的串流在完成前被它的讀取端放棄；等待同一句話的呼叫端須自行重新合成"""
+
+
+class TTSClient:
+    """語音合成入口：限制同時請求數，並在合成前查詢快取
+    
+    多個草藥同時需要同一句話時，只會送出一次合成請求；請求失敗時以指數退避
+    重試，成功的片段寫入快取。
+    """
+    
+    def __init__(self, concurrency=TTS_CONCURRENCY, cache: TTSCache = None,
+                 retries: int = TTS_RETRIES,
+                 backend: TTSBackend = None, voice: str = VOICE, rate: str = RATE, pitch: str = PITCH,
+                 batch: int = TTS_BATCH):
+        self.backend = backend or EdgeTTSBackend()
+        self.batch = max(1, batch)
+        self.voice = voice
+        self.rate = rate
+        self.pitch = pitch
+        # concurrency 為 "auto" 時依延遲與限流自動調整同時請求數
+        if concurrency == "auto":
+            self.limiter = AdaptiveLimiter()
+        else:
+            concurrency = max(1, concurrency)
+            self.limiter = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.cache = cache
+        self.retries = retries
+        self.segments = 0
+        self.requests = 0
+        self.retried = 0
+        self._pending = {}
+    
+    async def _backoff(self, attempt: int):
+        self.retried += 1
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+        # 加入隨機抖動，避免並行請求同時重試
+        with TRACER.span("tts.backoff", attempt=attempt):
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+    
+    def _slot(self):
+        """一次請求的並行名額"""
+        if isinstance(self.limiter, AdaptiveLimiter):
+            return self.limiter.slot()
+        return self.limiter
+    
+    async def _request(self, text: str, marked: bool = False):
+        synthesize = self.backend.synthesize_marked if marked else self.backend.synthesize
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slot():
+                    self.requests += 1
+                    with TRACER.span("tts.synthesize", chars=len(text), attempt=attempt):
+                        return await synthesize(text, self.voice, self.rate, self.pitch)
+            except NotImplementedError:
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                await self._backoff(attempt)
+    
+    async def _request_stream(self, text: str):
+        # 已經輸出過資料就無法從頭重來，只有在第一塊之前失敗才重試
+        for attempt in range(self.retries + 1):
+            started = False
+            try:
+                async with self._slot():
+                    self.requests += 1
+                    with TRACER.span("tts.stream", chars=len(text), attempt=attempt):
+                        async for chunk in self.backend.stream(text, self.voice, self.rate, self.pitch):
+                            started = True
+                            yield chunk
+                return
+            except Exception:
+                if started or attempt == self.retries:
+                    raise
+                await self._backoff(attempt)
+    
+    async def _fill(self, key: str, text: str, marked: bool = False):
+        result = await self._request(text, marked)
+        if marked:
+            audio, boundaries = result
+            self.cache.put(key, audio.data, {"boundaries": boundaries})
+        else:
+            self.cache.put(key, result.data)
+        return result
+    
+    def _coalesce(self, key: str, text: str, marked: bool = False):
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fill(key, text, marked))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return asyncio.shield(pending)
+    
+    async def audio(self, text: str) -> SpeechAudio:
+        """回傳 text 的語音（MP3 資料與長度）"""
+        self.segments += 1
+        if self.cache is None:
+            return await self._request(text)
         
-        # === 靜默空間 ===
-        ("現在，安靜地停留在這份感受中。", 3),
-        ("讓身體自然地吸收這份療癒能量。", 3),
-        ("", 20),
+        key = self.cache.key(text, self.voice, self.rate, self.pitch, self.backend.version)
+        data = self.cache.get(key)
+        if data is not None:
+            return SpeechAudio(data, mp3_duration(data))
+        return await self._coalesce(key, text)
+    
+    async def marked(self, lines: list):
+        """把多行合併成一次請求，回傳 (SpeechAudio, 邊界清單)"""
+        text = "\n".join(lines)
+        self.segments += len(lines)
+        if self.cache is None:
+            return await self._request(text, marked=True)
         
-        # === 結束引導 ===
-        (f"慢慢地，讓{herb['name']}的影像淡去。", 4),
-        ("但那份滋養的感覺，會留在你的身體裡。", 4),
-        ("感覺你的呼吸，感覺此刻的寧靜。", 4),
-        ("輕輕動一動手指和腳趾。", 3),
-        ("準備好的時候，慢慢睜開眼睛。", 4),
-        (f"{season_closings[herb['season']]}，繼續你的一天。", 5),
-    ]
+        key = self.cache.key(text, self.voice, self.rate, self.pitch,
+                             f"{self.backend.version}+boundaries")
+        data = self.cache.get(key)
+        meta = self.cache.get_meta(key) if data is not None else None
+        if meta is not None:
+            boundaries = [tuple(b) for b in meta["boundaries"]]
+            return SpeechAudio(data, mp3_duration(data)), boundaries
+        return await self._coalesce(key, text, marked=True)
     
-    return script
+    async def stream(self, text: str):
+        """逐塊產生 text 的 MP3 語音資料
+        
+        快取命中時一次輸出；未命中時邊合成邊輸出，結束後寫入快取。同一句話
+        已在合成中時，等待該次結果而不重複請求；該次合成的讀取端中途放棄時
+        （前瞻合成被取消、客戶端斷線），等待者改為自己合成，不受牽連。
+        """
+        self.segments += 1
+        if self.cache is None:
+            async for chunk in self._request_stream(text):
+                yield chunk
+            return
+        
+        key = self.cache.key(text, self.voice, self.rate, self.pitch, self.backend.version)
+        data = self.cache.get(key)
+        while data is None and key in self._pending:
+            try:
+                data = (await asyncio.shield(self._pending[key])).data
+            except StreamAbandoned:
+                # 可能已有其他等待者接手合成，再查一次
+                data = self.cache.get(key)
+        if data is not None:
+            yield data
+            return
+        
+        pending = asyncio.get_running_loop().create_future()
+        pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending[key] = pending
+        try:
+            chunks = []
+            async for chunk in self._request_stream(text):
+                chunks.append(chunk)
+                yield chunk
+            data = b"".join(chunks)
+            self.cache.put(key, data)
+            pending.set_result(SpeechAudio(data, mp3_duration(data)))
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            # 不取消共用的 future：取消會傳到每個 shield() 等待者，連帶中止其他草藥
+            if not pending.done():
+                pending.set_exception(StreamAbandoned(text))
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+    
+    async def speak(self, text: str, output_path: Path) -> float:
+        """把 text 的語音寫入 output_path，回傳語音長度（秒）"""
+        audio = await self.audio(text)
+        output_path.write_bytes(audio.data)
+        return audio.duration
+    
+    def cached_durations(self, lines: list) -> dict:
+        """已快取句子的實際語音長度 {句子: 秒}；只查索引與讀檔，不計入命中率"""
+        durations = {}
+        if self.cache is None:
+            return durations
+        for text in dict.fromkeys(lines):
+            key = self.cache.key(text, self.voice, self.rate, self.pitch, self.backend.version)
+            if key in self.cache:
+                try:
+                    durations[text] = mp3_duration(self.cache.path(key).read_bytes())
+                except FileNotFoundError:
+                    pass  # 快取檔被外部刪除，當作未快取
+        return durations
+    
+    async def durations(self, lines: list) -> dict:
+        """各句的實際語音長度 {句子: 秒}，尚未快取的句子先合成（並寫入快取）
+        
+        合併請求（batch > 1）時各句不會單獨快取，逐句合成只為了量長度會多出一倍
+        請求，因此只回傳已快取的句子。
+        """
+        durations = self.cached_durations(lines)
+        if self.batch > 1:
+            return durations
+        missing = [text for text in dict.fromkeys(lines) if text not in durations]
+        
+        async def measure(text):
+            if self.cache is None:
+                return await self._request(text)
+            key = self.cache.key(text, self.voice, self.rate, self.pitch, self.backend.version)
+            return await self._coalesce(key, text)
+        
+        for text, audio in zip(missing, await asyncio.gather(*map(measure, missing))):
+            durations[text] = audio.duration
+        return durations
 
 
-# ============================================================================
-# 音頻生成功能
-# ============================================================================
+FADE_IN_SEC = 3   # 開頭淡入長度
+FADE_OUT_SEC = 8  # 結尾淡出長度
 
-async def generate_speech(text: str, output_path: Path):
-    """用 edge-tts 生成語音"""
-    communicate = edge_tts.Communicate(text, VOICE, rate=RATE, pitch=PITCH)
-    await communicate.save(str(output_path))
+# Layer III 位元率表 (kbps)：MPEG-1 與 MPEG-2/2.5
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# 版本位元 → 取樣率表：3 = MPEG-1，2 = MPEG-2，0 = MPEG-2.5
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
 
 
-def create_silence(duration_sec: float, output_path: Path):
-    """用 ffmpeg 生成靜音檔"""
-    cmd = [
-        "ffmpeg", "-y", "-f", "lavfi",
-        "-i", "anullsrc=r=24000:cl=mono",
-        "-t", str(duration_sec),
-        "-c:a", "libmp3lame", "-q:a", "2",
-        str(output_path)
-    ]
-    subprocess.run(cmd, capture_output=True, check=False)
+def mp3_duration(data: bytes) -> float:
+    """逐幀解析 MP3 標頭計算實際長度（秒），不需另外啟動 ffprobe
+    
+    略過開頭的 ID3v2 標籤與不含音訊的 Xing/Info 標頭幀。
+    """
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        pos = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14
+                    | (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+    
+    samples = 0
+    sample_rate = 0
+    first_frame = True
+    while pos + 4 <= len(data):
+        b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+        version = (b1 >> 3) & 3
+        bitrate_idx = b2 >> 4
+        rate_idx = (b2 >> 2) & 3
+        if (data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1
+                or (b1 >> 1) & 3 != 1 or bitrate_idx in (0, 15) or rate_idx == 3):
+            # 不是 Layer III 幀頭，繼續尋找同步字
+            pos += 1
+            continue
+        
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_idx] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version][rate_idx]
+        frame_len = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 1)
+        
+        if first_frame:
+            first_frame = False
+            mono = (b3 >> 6) == 3
+            side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+            if data[pos + 4 + side_info:pos + 8 + side_info] in (b"Xing", b"Info"):
+                pos += frame_len
+                continue
+        
+        samples += 1152 if mpeg1 else 576
+        pos += frame_len
+    
+    return samples / sample_rate if sample_rate else 0.0
 
 
-def concat_audio_files(file_list: list, output_path: Path):
-    """用 ffmpeg 合併多個音頻檔"""
-    list_file = TEMP_DIR / "filelist.txt"
-    with open(list_file, "w", encoding="utf-8") as f:
-        for file in file_list:
-            safe_path = str(file.absolute()).replace("\\", "/")
-            f.write(f"file '{safe_path}'\n")
+def build_timeline_graph(timeline: list, duration_sec: float):
+    """把 [(語音檔或 None, 之後的停頓秒數), ...] 轉成 ffmpeg 的輸入清單與 filter graph
     
-    cmd = [
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-        "-i", str(list_file),
-        "-c:a", "libmp3lame", "-q:a", "2",
+    停頓以 apad 接在前一段語音之後；開頭若是停頓則以 adelay 延後第一段語音，
+    最後串接並加上淡入淡出，整條時間軸只需編碼一次。
+    """
+    # 沒有語音的停頓併入前一段語音的尾端
+    lead_silence = 0
+    clips = []
+    for speech_file, pause in timeline:
+        if speech_file is not None:
+            clips.append([speech_file, pause])
+        elif clips:
+            clips[-1][1] += pause
+        else:
+            lead_silence += pause
+    
+    inputs = []
+    filters = []
+    for idx, (speech_file, pause) in enumerate(clips):
+        inputs.append(speech_file)
+        chain = f"[{idx}:a]aresample=24000,aformat=channel_layouts=mono"
+        if idx == 0 and lead_silence > 0:
+            chain += f",adelay=delays={int(lead_silence * 1000)}:all=1"
+        if pause > 0:
+            chain += f",apad=pad_dur={pause}"
+        filters.append(f"{chain}[s{idx}]")
+    
+    fade_out_start = round(max(0, duration_sec - FADE_OUT_SEC), 3)
+    fades = (f"afade=t=in:st=0:d={FADE_IN_SEC},"
+             f"afade=t=out:st={fade_out_start}:d={FADE_OUT_SEC}")
+    streams = "".join(f"[s{idx}]" for idx in range(len(clips)))
+    filters.append(f"{streams}concat=n={len(clips)}:v=0:a=1,{fades}[out]")
+    return inputs, ";".join(filters)
+
+
+def render_timeline(timeline: list, output_path: Path, duration_sec: float):
+    """以單一 ffmpeg filter graph 組合語音、停頓與淡入淡出，只編碼一次
+    
+    duration_sec 必須是時間軸的實際總長，淡出才會落在結尾。
+    """
+    inputs, graph = build_timeline_graph(timeline, duration_sec)
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    for f in inputs:
+        cmd += ["-i", str(f)]
+    cmd += [
+        "-filter_complex", graph, "-map", "[out]",
+        *codec_args(output_path),
         str(output_path)
     ]
-    subprocess.run(cmd, capture_output=True, check=False)
+    with TRACER.span("ffmpeg.render", inputs=len(inputs)):
+        result = subprocess.run(cmd, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"編碼失敗：{result.stderr.decode(errors='replace').strip()}")
 
 
-def add_fade(input_path: Path, output_path: Path, duration_sec: float):
-    """加入淡入淡出效果"""
-    fade_out_start = max(0, duration_sec - 8)
+def decode_to_pcm(data: bytes) -> bytes:
+    """把 MP3 資料經由管線解碼成 24kHz 單聲道 16-bit PCM，不經過暫存檔"""
     cmd = [
-        "ffmpeg", "-y", "-i", str(input_path),
-        "-af", f"afade=t=in:st=0:d=3,afade=t=out:st={fade_out_start}:d=8",
-        "-c:a", "libmp3lame", "-q:a", "2",
-        str(output_path)
+        "ffmpeg", "-v", "error", "-f", "mp3", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"
     ]
-    result = subprocess.run(cmd, capture_output=True, check=False)
+    with TRACER.span("ffmpeg.decode", bytes=len(data)):
+        result = subprocess.run(cmd, input=data, capture_output=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"語音解碼失敗：{result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def silence_pcm(duration_sec: float) -> bytes:
+    """指定長度的靜音 PCM（全零）"""
+    return bytes(int(duration_sec * SAMPLE_RATE) * 2)
+
+
+def gain_ramp(pcm: bytes, start: float, end: float) -> bytes:
+    """對一段 PCM 套用由 start 線性變化到 end 的增益"""
+    count = len(pcm) // 2
+    if count == 0:
+        return pcm
     
+    if np is not None:
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+        samples *= np.linspace(start, end, count, endpoint=False, dtype=np.float32)
+        return samples.astype("<i2").tobytes()
+    
+    samples = array("h", pcm)
+    if sys.byteorder != "little":
+        samples.byteswap()
+    step = (end - start) / count
+    for i in range(count):
+        samples[i] = int(samples[i] * (start + step * i))
+    if sys.byteorder != "little":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def apply_fades(pcm: bytes) -> bytes:
+    """以增益斜坡對 PCM 開頭淡入、結尾淡出"""
+    fade_in = min(len(pcm) // 2, FADE_IN_SEC * SAMPLE_RATE) * 2
+    fade_out = min(len(pcm) // 2, FADE_OUT_SEC * SAMPLE_RATE) * 2
+    pcm = gain_ramp(pcm[:fade_in], 0.0, 1.0) + pcm[fade_in:]
+    return pcm[:len(pcm) - fade_out] + gain_ramp(pcm[len(pcm) - fade_out:], 1.0, 0.0)
+
+
+def codec_args(output_path: Path) -> list:
+    """依輸出副檔名選擇編碼參數：.flac 為無損母帶，其餘對應 RENDITIONS 中的格式"""
+    if output_path.suffix == ".flac":
+        return MASTER_ARGS
+    for rendition in RENDITIONS.values():
+        if rendition["ext"] == output_path.suffix:
+            return rendition["args"]
+    raise ValueError(f"不支援的輸出格式：{output_path.name}")
+
+
+def pcm_encoder_cmd(output_path: Path) -> list:
+    """從 stdin 讀取 PCM 並依副檔名編碼的 ffmpeg 指令"""
+    return [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0",
+        *codec_args(output_path),
+        str(output_path)
+    ]
+
+
+def encode_pcm(pcm: bytes, output_path: Path):
+    """把整段 PCM 從 stdin 送進單一編碼器"""
+    cmd = pcm_encoder_cmd(output_path)
+    with TRACER.span("ffmpeg.encode", bytes=len(pcm)):
+        result = subprocess.run(cmd, input=pcm, capture_output=True, check=False)
     if result.returncode != 0:
-        # 如果失敗，只加淡入
-        cmd = [
-            "ffmpeg", "-y", "-i", str(input_path),
-            "-af", "afade=t=in:st=0:d=3",
-            "-c:a", "libmp3lame", "-q:a", "2",
-            str(output_path)
-        ]
-        subprocess.run(cmd, capture_output=True, check=False)
+        raise RuntimeError(f"編碼失敗：{result.stderr.decode(errors='replace').strip()}")
+
+
+@asynccontextmanager
+async def ffmpeg_process(stage: str, cmd: list, **kwargs):
+    """啟動 ffmpeg 子行程，從啟動到結束記錄為 ffmpeg.<stage> 區段（計入建置指標）
+    
+    離開區塊時行程若仍在執行（例外或取消）就強制結束，不留下孤兒行程。
+    """
+    with TRACER.span(f"ffmpeg.{stage}"):
+        process = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+        try:
+            yield process
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+async def gather_segments(jobs: list, progress_callback=None) -> list:
+    """並行執行所有片段工作，回傳依原順序排列的結果；任一失敗時取消其餘工作"""
+    tasks = [asyncio.ensure_future(job) for job in jobs]
+    try:
+        for done, finished in enumerate(asyncio.as_completed(tasks), 1):
+            await finished
+            if progress_callback:
+                progress_callback(done, len(tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return [task.result() for task in tasks]
 
 
-async def generate_herb_meditation(herb: dict, progress_callback=None):
-    """生成單個草藥的冥想音檔"""
+def line_spans(lines: list, boundaries: list):
+    """依斷詞時間找出每行的 (開始秒, 結束秒)；有任何一行對不上時回傳 None"""
+    joined = "\n".join(lines)
+    starts = []
+    position = 0
+    for line in lines:
+        starts.append(position)
+        position += len(line) + 1
     
-    herb_id = herb['id']
-    herb_name = herb['name']
-    herb_pinyin = herb['pinyin']
+    spans = [None] * len(lines)
+    cursor = 0
+    for offset, duration, word in boundaries:
+        index = joined.find(word, cursor) if word else -1
+        if index < 0:
+            continue
+        cursor = index + len(word)
+        line = bisect_right(starts, index) - 1
+        if spans[line] is None:
+            spans[line] = [offset, offset + duration]
+        else:
+            spans[line][1] = offset + duration
     
-    # 生成腳本
-    script = generate_meditation_script(herb)
+    if None in spans:
+        return None
+    # 時間必須依行遞增，否則無法切開
+    if any(a[1] > b[0] for a, b in zip(spans, spans[1:])):
+        return None
+    return spans
+
+
+def split_marked_pcm(pcm: bytes, spans: list) -> list:
+    """在相鄰兩行之間的空白中點切開 PCM，第一行從頭開始、最後一行到結尾"""
+    cuts = [0]
+    for (_, end), (begin, _) in zip(spans, spans[1:]):
+        cuts.append(int((end + begin) / 2 * SAMPLE_RATE) * 2)
+    cuts.append(len(pcm))
+    return [pcm[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+async def speech_pcm(tts: TTSClient, text: str) -> bytes:
+    """單行語音解碼成 PCM"""
+    audio = await tts.audio(text)
+    return await asyncio.to_thread(decode_to_pcm, audio.data)
+
+
+async def batch_speech_pcm(tts: TTSClient, lines: list) -> list:
+    """多行合併成一次請求，解碼後依斷詞時間切回各行的 PCM
     
-    # 建立暫存目錄
-    herb_temp_dir = TEMP_DIR / f"herb_{herb_id:02d}"
-    herb_temp_dir.mkdir(parents=True, exist_ok=True)
+    斷詞對不上腳本（例如後端改寫了文字）時，這一批改回逐行合成。
+    """
+    if len(lines) > 1:
+        audio, boundaries = await tts.marked(lines)
+        spans = line_spans(lines, boundaries)
+        if spans is not None:
+            pcm = await asyncio.to_thread(decode_to_pcm, audio.data)
+            return split_marked_pcm(pcm, spans)
+    return list(await asyncio.gather(*(speech_pcm(tts, text) for text in lines)))
+
+
+def batched(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def assemble_with_graph(script: list, tts: TTSClient, output_path: Path,
+                              work_dir: Path, progress_callback=None):
+    """語音片段寫入 work_dir，再以單一 filter graph 組合並編碼
     
-    audio_files = []
-    segment_idx = 0
-    total_duration = 0
+    每段語音的長度直接從 MP3 幀計算，累加成精確的時間軸總長供淡出定位。
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
     
-    for i, (text, pause) in enumerate(script):
-        # 生成語音
+    speech_files = []
+    jobs = []
+    for text, pause in script:
+        speech_file = None
         if text.strip():
-            speech_file = herb_temp_dir / f"seg_{segment_idx:03d}_speech.mp3"
-            await generate_speech(text, speech_file)
-            audio_files.append(speech_file)
-            segment_idx += 1
-            # 估算語音時長（約每個中文字0.3秒）
-            total_duration += len(text) * 0.3
-        
-        # 生成停頓
+            speech_file = work_dir / f"seg_{len(jobs):03d}_speech.mp3"
+            jobs.append(tts.speak(text, speech_file))
+        speech_files.append(speech_file)
+    
+    try:
+        durations = await gather_segments(jobs, progress_callback)
+        total_duration = sum(durations) + sum(pause for _, pause in script)
+        timeline = [(speech_file, pause) for speech_file, (_, pause) in zip(speech_files, script)]
+        await asyncio.to_thread(render_timeline, timeline, output_path, total_duration)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def assemble_in_memory(script: list, tts: TTSClient, output_path: Path,
+                             work_dir: Path = None, progress_callback=None):
+    """語音在記憶體中解碼成 PCM，停頓補零、淡入淡出以增益斜坡處理，
+    最後整段經 stdin 送進編碼器，全程不產生暫存檔"""
+    lines = [text for text, _ in script if text.strip()]
+    if tts.batch > 1:
+        jobs = [batch_speech_pcm(tts, group) for group in batched(lines, tts.batch)]
+        speech = chain.from_iterable(await gather_segments(jobs, progress_callback))
+    else:
+        jobs = [speech_pcm(tts, text) for text in lines]
+        speech = iter(await gather_segments(jobs, progress_callback))
+    
+    parts = []
+    for text, pause in script:
+        if text.strip():
+            parts.append(next(speech))
         if pause > 0:
-            silence_file = herb_temp_dir / f"seg_{segment_idx:03d}_silence.mp3"
-            create_silence(pause, silence_file)
-            audio_files.append(silence_file)
-            segment_idx += 1
-            total_duration += pause
-    
-    # 合併音頻
-    temp_concat = herb_temp_dir / "concat.mp3"
-    concat_audio_files(audio_files, temp_concat)
-    
-    # 加入淡入淡出
-    output_filename = f"meditation_{herb_id:02d}_{herb_pinyin}.mp3"
-    final_output = OUTPUT_DIR / output_filename
-    add_fade(temp_concat, final_output, total_duration)
-    
-    # 清理暫存
-    for f in herb_temp_dir.glob("*"):
+            parts.append(silence_pcm(pause))
+    
+    pcm = apply_fades(b"".join(parts))
+    await asyncio.to_thread(encode_pcm, pcm, output_path)
+
+
+class FadingPCMWriter:
+    """把 PCM 依序寫入編碼器：寫入時即套用淡入，並保留最後一段作為淡出緩衝
+    
+    結尾位置要等全部寫完才知道，因此最後 FADE_OUT_SEC 秒的資料延到 close() 才送出。
+    """
+    
+    def __init__(self, stream: asyncio.StreamWriter):
+        self.stream = stream
+        self.position = 0
+        self.fade_in = FADE_IN_SEC * SAMPLE_RATE
+        self.tail_bytes = FADE_OUT_SEC * SAMPLE_RATE * 2
+        self._carry = b""
+        self._tail = bytearray()
+    
+    async def write(self, pcm: bytes):
+        # 解碼器輸出的區塊可能在樣本中間切開，奇數位元組留到下一次
+        pcm = self._carry + pcm
+        cut = len(pcm) - len(pcm) % 2
+        pcm, self._carry = pcm[:cut], pcm[cut:]
+        
+        if self.position < self.fade_in:
+            count = min(len(pcm) // 2, self.fade_in - self.position)
+            head = gain_ramp(pcm[:count * 2], self.position / self.fade_in,
+                             (self.position + count) / self.fade_in)
+            pcm = head + pcm[count * 2:]
+        self.position += len(pcm) // 2
+        
+        self._tail += pcm
+        excess = len(self._tail) - self.tail_bytes
+        if excess > 0:
+            self.stream.write(bytes(self._tail[:excess]))
+            del self._tail[:excess]
+            await self.stream.drain()
+    
+    async def close(self):
+        self.stream.write(gain_ramp(bytes(self._tail), 1.0, 0.0))
+        await self.stream.drain()
+        self.stream.close()
+
+
+def fail_queue(queue: asyncio.Queue, error: BaseException):
+    """以例外取代 queue 中尚未寫入的資料（這句已經失敗，不必保留），讓讀取端立即看到"""
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(error)
+
+
+async def stream_speech_pcm(tts: TTSClient, text: str, queue: asyncio.Queue):
+    """把 TTS 串流的 MP3 區塊邊收邊送進解碼器，解出的 PCM 依序放入 queue
+    
+    queue 有容量上限，寫入端跟不上時解碼器與 TTS 串流會跟著暫停。
+    結束時放入 None；失敗時放入例外物件並重新拋出。
+    """
+    cmd = [
+        "ffmpeg", "-v", "error", "-f", "mp3", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"
+    ]
+    
+    async def feed(decoder):
         try:
-            f.unlink()
-        except:
-            pass
+            async for chunk in tts.stream(text):
+                decoder.stdin.write(chunk)
+                await decoder.stdin.drain()
+        finally:
+            decoder.stdin.close()
+    
+    async def drain_output(decoder):
+        while chunk := await decoder.stdout.read(65536):
+            await queue.put(chunk)
+    
+    try:
+        async with ffmpeg_process("stream_decode", cmd, stdin=asyncio.subprocess.PIPE,
+                                  stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE) as decoder:
+            with TRACER.span("speech.stream", chars=len(text)):
+                _, _, stderr = await asyncio.gather(feed(decoder), drain_output(decoder), decoder.stderr.read())
+            if await decoder.wait() != 0:
+                raise RuntimeError(f"語音解碼失敗：{stderr.decode(errors='replace').strip()}")
+        await queue.put(None)
+    except BaseException as e:
+        fail_queue(queue, e)
+        raise
+
+
+async def batch_speech_queues(tts: TTSClient, lines: list, queues: list):
+    """合併請求的版本：整批解碼後，各行的 PCM 放入各自的 queue"""
     try:
-        herb_temp_dir.rmdir()
-    except:
-        pass
+        parts = await batch_speech_pcm(tts, lines)
+    except BaseException as e:
+        for queue in queues:
+            fail_queue(queue, e)
+        raise
+    for queue, pcm in zip(queues, parts):
+        await queue.put(pcm)
+        await queue.put(None)
+
+
+async def write_script_pcm(script: list, tts: TTSClient, writer: FadingPCMWriter,
+                           progress_callback=None):
+    """依腳本順序把各句語音（TTS 串流直接解碼成 PCM）與停頓寫入 writer
+    
+    寫入第 N 句時，之後最多 STREAM_LOOKAHEAD 句同時合成與解碼，每句先解出的
+    PCM 也有上限，同時存在的解碼器數量與記憶體用量都與腳本長度無關；
+    任一句失敗時取消其餘合成並拋出例外。
+    """
+    lines = [text for text, _ in script if text.strip()]
+    queues = [asyncio.Queue(STREAM_QUEUE_CHUNKS) for _ in lines]
+    if tts.batch > 1:
+        # 合併請求時須等整批的斷詞時間才能切開，改以批為單位邊合成邊編碼
+        producers = [partial(batch_speech_queues, tts, group, queue_group)
+                     for group, queue_group in zip(batched(lines, tts.batch), batched(queues, tts.batch))]
+    else:
+        producers = [partial(stream_speech_pcm, tts, text, queue)
+                     for text, queue in zip(lines, queues)]
+    tasks = []
+    
+    try:
+        queue_iter = enumerate(queues)
+        for done, (text, pause) in enumerate(script, 1):
+            if text.strip():
+                line, queue = next(queue_iter)
+                # 開始這句（或這批）與之後 STREAM_LOOKAHEAD 個的合成
+                ahead = min(len(producers), line // tts.batch + 1 + STREAM_LOOKAHEAD)
+                while len(tasks) < ahead:
+                    tasks.append(asyncio.ensure_future(producers[len(tasks)]()))
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, BaseException):
+                        raise chunk
+                    await writer.write(chunk)
+            if pause > 0:
+                await writer.write(silence_pcm(pause))
+            if progress_callback:
+                progress_callback(done, len(script))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def assemble_streaming(script: list, tts: TTSClient, output_path: Path,
+                             work_dir: Path = None, progress_callback=None):
+    """邊合成邊編碼：各句語音依腳本順序連同停頓送進同一個編碼器，全程不產生暫存檔"""
+    async with ffmpeg_process("stream_encode", pcm_encoder_cmd(output_path), stdin=asyncio.subprocess.PIPE,
+                              stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE) as encoder:
+        writer = FadingPCMWriter(encoder.stdin)
+        await write_script_pcm(script, tts, writer, progress_callback)
+        await writer.close()
+        stderr = await encoder.stderr.read()
+        if await encoder.wait() != 0:
+            raise RuntimeError(f"編碼失敗：{stderr.decode(errors='replace').strip()}")
+
+
+ASSEMBLERS = {
+    "graph": assemble_with_graph,
+    "pcm": assemble_in_memory,
+    "stream": assemble_streaming,
+}
+
+
+def rendition_paths(output_file: Path, renditions=DEFAULT_RENDITIONS) -> dict:
+    """MP3 輸出檔對應的各發佈版本路徑 {格式: 路徑}，檔名只差在副檔名"""
+    return {name: output_file.with_suffix(RENDITIONS[name]["ext"]) for name in renditions}
+
+
+async def encode_rendition(master: Path, name: str, output_path: Path):
+    """把無損母帶編碼成一個發佈版本"""
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(master), *RENDITIONS[name]["args"], str(output_path)]
+    async with ffmpeg_process(name, cmd, stdout=asyncio.subprocess.DEVNULL,
+                              stderr=asyncio.subprocess.PIPE) as process:
+        _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"{name} 編碼失敗：{stderr.decode(errors='replace').strip()}")
+
+
+def output_path(herb: dict, minutes: int = None) -> Path:
+    """草藥的 MP3 輸出路徑；調整長度的版本在檔名後加上分鐘數"""
+    suffix = f"_{minutes}min" if minutes is not None else ""
+    return OUTPUT_DIR / f"meditation_{herb['id']:02d}_{herb['pinyin']}{suffix}.mp3"
+
+
+async def generate_herb_meditation(herb: dict, progress_callback=None, tts: TTSClient = None,
+                                   assembly: str = ASSEMBLY, renditions=DEFAULT_RENDITIONS,
+                                   minutes: int = None):
+    """生成單個草藥的冥想音檔，回傳 MP3 的路徑
+    
+    各段語音並行合成（由 tts 限制同時請求數並查詢快取），再由 assembly 指定的
+    方式依腳本順序組合停頓與淡入淡出成一份無損母帶，最後從母帶並行編碼出
+    renditions 列出的各種發佈版本。指定 minutes 時先取得各句的實際長度，
+    再把腳本調整成約 minutes 分鐘。
+    """
+    
+    if tts is None:
+        tts = TTSClient()
+    
+    # 生成腳本
+    with TRACER.span("script"):
+        durations = await tts.durations(speech_lines(herb)) if minutes is not None else None
+        script = generate_meditation_script(herb, minutes, durations)
+    
+    final_output = output_path(herb, minutes)
+    herb_temp_dir = TEMP_DIR / final_output.stem
+    
+    master = TEMP_DIR / f"{final_output.stem}.master.flac"
+    master.parent.mkdir(parents=True, exist_ok=True)
+    
+    # 各版本先寫入暫存檔，全部成功後才取代舊的輸出，失敗時不會破壞既有音檔
+    outputs = rendition_paths(final_output, dict.fromkeys([*renditions, "mp3"]))
+    parts = {name: path.with_name(f"{path.stem}.part{path.suffix}") for name, path in outputs.items()}
+    try:
+        with TRACER.span(f"assemble.{assembly}"):
+            await ASSEMBLERS[assembly](script, tts, master, herb_temp_dir, progress_callback)
+        await gather_segments([encode_rendition(master, name, part) for name, part in parts.items()])
+        for name, part in parts.items():
+            os.replace(part, outputs[name])
+    finally:
+        master.unlink(missing_ok=True)
+        for part in parts.values():
+            part.unlink(missing_ok=True)
     
     return final_output
 
 
+# ============================================================================
+# 增量建置清單
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def ffmpeg_version() -> str:
+    """ffmpeg 版本字串（整批只查詢一次）"""
+    try:
+        with TRACER.span("ffmpeg.version"):
+            result = subprocess.run(["ffmpeg", "-version"], capture_output=True, check=False)
+    except FileNotFoundError:
+        return "missing"
+    return result.stdout.decode(errors="replace").split("\n", 1)[0].strip()
+
+
+def herb_build_hash(herb: dict, tts: "TTSClient", assembly: str = ASSEMBLY,
+                    renditions=DEFAULT_RENDITIONS, minutes: int = None) -> str:
+    """計算影響單個草藥輸出的所有輸入的雜湊：草藥資料、腳本、語音設定、發佈格式與工具版本
+    
+    調整長度的腳本依快取中各句的實際長度計算，句子第一次合成後雜湊可能改變一次。
+    """
+    durations = tts.cached_durations(speech_lines(herb)) if minutes is not None else None
+    inputs = {
+        "herb": herb,
+        "script": generate_meditation_script(herb, minutes, durations),
+        "voice": [tts.voice, tts.rate, tts.pitch, tts.batch],
+        "audio": [SAMPLE_RATE, FADE_IN_SEC, FADE_OUT_SEC, assembly, PIPELINE_VERSION],
+        "renditions": [[name, RENDITIONS[name]["args"]] for name in renditions],
+        "tools": [tts.backend.version, ffmpeg_version()],
+    }
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def manifest_key(herb_id: int, minutes: int = None) -> str:
+    """建置清單與版本清單中的鍵：標準長度為草藥編號，調整長度的版本為「編號@分鐘數」"""
+    return str(herb_id) if minutes is None else f"{herb_id}@{minutes}"
+
+
+def manifest_order(key: str) -> tuple:
+    """依草藥編號、再依長度（標準長度在前）排序"""
+    herb_id, _, minutes = key.partition("@")
+    return int(herb_id), int(minutes or 0)
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    """讀取建置清單 {manifest_key: {file, hash, bytes, renditions}}；不存在或損毀時回傳空清單"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("herbs", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(entries: dict, path: Path = MANIFEST_PATH, shard: dict = None):
+    """寫入建置清單（先寫暫存檔再取代，避免中斷時留下半份檔案）
+    
+    分片建置時 shard 記錄這台機器負責的分片、草藥與長度，供 --merge 檢查。
+    """
+    ordered = dict(sorted(entries.items(), key=lambda item: manifest_order(item[0])))
+    manifest = {"version": 1, "herbs": ordered}
+    if shard is not None:
+        manifest["shard"] = shard
+    part_file = path.with_suffix(".json.part")
+    with open(part_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(part_file, path)
+
+
+def manifest_entry(output_file: Path, build_hash: str, renditions=DEFAULT_RENDITIONS) -> dict:
+    """剛生成的草藥在建置清單中的紀錄，renditions 依偏好順序記錄各版本的大小"""
+    return {
+        "file": output_file.name,
+        "hash": build_hash,
+        "bytes": output_file.stat().st_size,
+        "renditions": {name: path.stat().st_size
+                       for name, path in rendition_paths(output_file, renditions).items()},
+    }
+
+
+def entry_files(entry: dict, output_dir: Path = OUTPUT_DIR) -> dict:
+    """建置清單紀錄對應的所有輸出檔 {路徑: 大小}（MP3 與各發佈版本）"""
+    output_file = output_dir / entry["file"]
+    files = {output_file: entry.get("bytes")}
+    for name, size in entry.get("renditions", {}).items():
+        files[output_file.with_suffix(RENDITIONS[name]["ext"])] = size
+    return files
+
+
+def is_up_to_date(herb: dict, entries: dict, build_hash: str, minutes: int = None) -> bool:
+    """清單中的雜湊相符且所有輸出檔仍存在（大小相同）時視為最新"""
+    entry = entries.get(manifest_key(herb['id'], minutes))
+    if not entry or entry.get("hash") != build_hash:
+        return False
+    return all(path.exists() and path.stat().st_size == size
+               for path, size in entry_files(entry).items())
+
+
+def save_renditions(entries: dict, path: Path = None):
+    """由建置清單寫出前端使用的版本清單 {manifest_key: [{src, type, bitrate, bytes}, ...]}
+    
+    每個草藥的版本依偏好順序排列，src 是相對於音檔目錄的檔名；標準長度的鍵就是
+    草藥編號，調整長度的版本另有「編號@分鐘數」的鍵。
+    """
+    path = path or OUTPUT_DIR / RENDITIONS_FILE
+    herbs = {}
+    for key, entry in sorted(entries.items(), key=lambda item: manifest_order(item[0])):
+        output_file = Path(entry["file"])
+        sizes = entry.get("renditions") or {"mp3": entry["bytes"]}
+        herbs[key] = [{
+            "src": output_file.with_suffix(RENDITIONS[name]["ext"]).name,
+            "type": RENDITIONS[name]["type"],
+            "bitrate": RENDITIONS[name]["bitrate"],
+            "bytes": size,
+        } for name, size in sizes.items()]
+    part_file = path.with_suffix(".json.part")
+    with open(part_file, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "herbs": herbs}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(part_file, path)
+
+
+# ============================================================================
+# 分片建置
+# ============================================================================
+
+class Shard(NamedTuple):
+    """N 台機器分工時的第 index 份（1 起算），依草藥編號輪流分配，編號不變分配就不變"""
+    index: int
+    count: int
+    
+    def owns(self, herb: dict) -> bool:
+        return (herb['id'] - 1) % self.count == self.index - 1
+    
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def shard_arg(value: str) -> Shard:
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式應為 i/N，例如 2/4：{value}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"分片編號須介於 1 與 {count} 之間：{value}")
+    return Shard(index, count)
+
+
+def load_shard(shard_dir: Path) -> dict:
+    """讀取一個分片目錄（分片機器的專案目錄或其複本）中的建置清單"""
+    manifest_path = shard_dir / MANIFEST_PATH.relative_to(SCRIPT_DIR)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        raise RuntimeError(f"{shard_dir}：無法讀取建置清單（{e}）")
+    if "shard" not in manifest:
+        raise RuntimeError(f"{shard_dir}：不是以 --shard 建置的輸出")
+    return manifest
+
+
+def check_shards(shard_dirs: list) -> dict:
+    """檢查各分片是否齊全、沒有重複，且負責的草藥都有完整的輸出
+    
+    回傳要合併的 {manifest_key: (分片目錄, 清單紀錄)}；有任何問題時列出全部問題並拋出
+    RuntimeError，此時還沒有複製任何檔案。
+    """
+    shards = [(shard_dir, load_shard(shard_dir)) for shard_dir in shard_dirs]
+    problems = []
+    counts = {manifest["shard"]["count"] for _, manifest in shards}
+    if len(counts) > 1:
+        problems.append(f"分片總數不一致：{', '.join(map(str, sorted(counts)))}")
+    count = max(counts)
+    
+    seen = {}
+    for shard_dir, manifest in shards:
+        index = manifest["shard"]["index"]
+        if index in seen:
+            problems.append(f"分片 {index}/{count} 重複：{seen[index]} 與 {shard_dir}")
+        seen[index] = shard_dir
+    problems += [f"缺少分片 {index}/{count}" for index in range(1, count + 1) if index not in seen]
+    
+    merged = {}
+    for shard_dir, manifest in shards:
+        shard = Shard(manifest["shard"]["index"], manifest["shard"]["count"])
+        output_dir = shard_dir / OUTPUT_DIR.relative_to(SCRIPT_DIR)
+        for herb_id in manifest["shard"]["herbs"]:
+            for minutes in manifest["shard"].get("lengths", [None]):
+                key = manifest_key(herb_id, minutes)
+                entry = manifest["herbs"].get(key)
+                if key in merged:
+                    problems.append(f"草藥 {key} 同時出現在 {merged[key][0]} 與 {shard_dir}")
+                elif entry is None:
+                    problems.append(f"草藥 {key} 缺少輸出（分片 {shard}：{shard_dir}）")
+                else:
+                    missing = [path.name for path, size in entry_files(entry, output_dir).items()
+                               if not path.exists() or path.stat().st_size != size]
+                    if missing:
+                        problems.append(f"草藥 {key} 的檔案不存在或大小不符：{', '.join(missing)}"
+                                        f"（分片 {shard}：{shard_dir}）")
+                    merged[key] = (shard_dir, entry)
+    
+    if problems:
+        raise RuntimeError("\n".join(problems))
+    return merged
+
+
+def copy_atomic(source: Path, target: Path):
+    part_file = target.with_name(f"{target.stem}.part{target.suffix}")
+    shutil.copyfile(source, part_file)
+    os.replace(part_file, target)
+
+
+def merge_shards(shard_dirs: list) -> dict:
+    """檢查通過後，把各分片的輸出複製到 OUTPUT_DIR 並合併進本機的建置清單，回傳合併的紀錄"""
+    merged = check_shards(shard_dirs)
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest()
+    for key, (shard_dir, entry) in merged.items():
+        source_dir = shard_dir / OUTPUT_DIR.relative_to(SCRIPT_DIR)
+        for path in entry_files(entry, source_dir):
+            copy_atomic(path, OUTPUT_DIR / path.name)
+        manifest[key] = entry
+    save_manifest(manifest)
+    save_renditions(manifest)
+    return merged
+
+
+# ============================================================================
+# 並行批量生成
+# ============================================================================
+
+async def render_herb(herb: dict, semaphore: asyncio.Semaphore,
+                      abort: asyncio.Event = None, minutes: int = None, **options):
+    """在並行上限內生成單個草藥（minutes 分鐘的版本），回傳結果紀錄（不拋出例外）
+    
+    abort 被設定後尚未開始的草藥直接標記為略過；options 直接傳給
+    generate_herb_meditation()。
+    """
+    async with semaphore:
+        herb_start = datetime.now()
+        result = {"herb": herb, "minutes": minutes, "output": None, "error": None, "skipped": False}
+        if abort is not None and abort.is_set():
+            result.update(error="失敗次數已達上限，未執行", skipped=True, elapsed=0.0)
+            return result
+        try:
+            with TRACER.span("herb", herb=herb['pinyin'], minutes=minutes):
+                output_file = await generate_herb_meditation(herb, minutes=minutes, **options)
+            if output_file.exists():
+                result["output"] = output_file
+            else:
+                result["error"] = "生成失敗"
+        except Exception as e:
+            result["error"] = str(e)
+        result["elapsed"] = (datetime.now() - herb_start).total_seconds()
+        return result
+
+
+def length_label(minutes: int = None) -> str:
+    return "標準長度" if minutes is None else f"{minutes} 分鐘"
+
+
+async def render_herbs(builds: list, jobs: int = 1, tts: TTSClient = None,
+                       on_result=None, max_failures: int = MAX_FAILURES, **options):
+    """以最多 jobs 個並行任務生成 builds 中的每個 (草藥, 分鐘數)，依完成順序回報並按原順序回傳結果
+    
+    分鐘數為 None 時生成標準長度。所有草藥共用同一個 TTSClient，避免並行數相乘
+    後壓垮 TTS 服務；每完成一個就呼叫 on_result(result)。失敗的達到 max_failures
+    個時不再啟動新的（0 表示不限制），其餘 options 直接傳給 generate_herb_meditation()。
+    """
+    if tts is None:
+        tts = TTSClient()
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    abort = asyncio.Event()
+    failures = 0
+    tasks = [asyncio.create_task(render_herb(herb, semaphore, abort, minutes, tts=tts, **options),
+                                 name=output_path(herb, minutes).stem.replace("meditation", "herb", 1))
+             for herb, minutes in builds]
+    total = len(tasks)
+    
+    for done, finished in enumerate(asyncio.as_completed(tasks), 1):
+        result = await finished
+        herb = result["herb"]
+        length = f"（{length_label(result['minutes'])}）" if result["minutes"] is not None else ""
+        print(f"\n[{done:2d}/{total}] [herb] {herb['name']} ({herb['pinyin']}){length} - {herb['effect']}")
+        if result["output"]:
+            file_size = result["output"].stat().st_size / 1024
+            print(f"       [OK] 完成：{result['output'].name} ({file_size:.0f} KB, {result['elapsed']:.1f}秒)")
+        elif result["skipped"]:
+            print(f"       [-] 略過：{result['error']}")
+        else:
+            print(f"       [X] 錯誤：{result['error']}")
+            failures += 1
+            if max_failures and failures >= max_failures and not abort.is_set():
+                print(f"\n[STOP] 已有 {failures} 個草藥失敗，不再啟動新的草藥")
+                abort.set()
+        if on_result:
+            on_result(result)
+    
+    return [task.result() for task in tasks]
+
+
+# ============================================================================
+# 建置計畫
+# ============================================================================
+
+def speech_units(script: list, batch: int) -> list:
+    """腳本中每次語音請求涵蓋的行（與組合時的分批方式相同）"""
+    lines = [text for text, _ in script if text.strip()]
+    return batched(lines, batch) if batch > 1 else [[line] for line in lines]
+
+
+def plan_build(builds: list, tts: TTSClient, assembly: str, jobs: int, skipped: int = 0,
+               renditions=DEFAULT_RENDITIONS) -> dict:
+    """不呼叫語音後端，估算生成 builds 中每個 (草藥, 分鐘數) 需要的工作量與時間
+    
+    快取只查索引（不更新），已快取的片段以實際長度計算，其餘依字數估計。
+    """
+    tone = isinstance(tts.backend, ToneBackend)
+    segments = 0
+    line_counts = {}
+    request_keys = set()
+    cached_keys = set()
+    decodes = 0
+    audio_sec = 0.0
+    
+    for herb, minutes in builds:
+        durations = tts.cached_durations(speech_lines(herb)) if minutes is not None else None
+        script = generate_meditation_script(herb, minutes, durations)
+        audio_sec += sum(pause for _, pause in script)
+        for text, _ in script:
+            if text.strip():
+                segments += 1
+                line_counts[text] = line_counts.get(text, 0) + 1
+        
+        for unit in speech_units(script, tts.batch):
+            decodes += 1
+            text = "\n".join(unit)
+            version = tts.backend.version + ("+boundaries" if len(unit) > 1 else "")
+            key = tts.cache.key(text, tts.voice, tts.rate, tts.pitch, version) if tts.cache else text
+            if tts.cache is not None and key in tts.cache:
+                cached_keys.add(key)
+                audio_sec += mp3_duration(tts.cache.path(key).read_bytes())
+            else:
+                request_keys.add(key)
+                if tone:
+                    audio_sec += ToneBackend.tone_for(text, tts.voice, tts.rate, tts.pitch)[1]
+                else:
+                    audio_sec += len(text) * PLAN_SEC_PER_CHAR
+    
+    # graph 以一次 filter graph 組合；pcm、stream 每次請求解碼一次，再加一個編碼器；
+    # 之後每個發佈版本各從母帶編碼一次
+    outputs = set(renditions) | {"mp3"}
+    ffmpeg_runs = len(builds) if assembly == "graph" else decodes + len(builds)
+    ffmpeg_runs += len(builds) * len(outputs)
+    if tone:
+        ffmpeg_runs += len(request_keys)
+    
+    concurrency = tts.limiter.limit if isinstance(tts.limiter, AdaptiveLimiter) else tts.concurrency
+    tts_sec = len(request_keys) * tts.backend.expected_latency / concurrency
+    encode_sec = sum(audio_sec / PLAN_ENCODE_REALTIME[name] for name in outputs)
+    ffmpeg_sec = (audio_sec / PLAN_FFMPEG_REALTIME + encode_sec) / max(1, jobs)
+    return {
+        "herbs": len(builds),
+        "skipped": skipped,
+        "segments": segments,
+        "unique_lines": len(line_counts),
+        "duplicate_lines": segments - len(line_counts),
+        "cached": len(cached_keys),
+        "requests": len(request_keys),
+        "ffmpeg_runs": ffmpeg_runs,
+        "audio_sec": audio_sec,
+        "tts_sec": tts_sec,
+        "ffmpeg_sec": ffmpeg_sec,
+        "wall_sec": tts_sec + ffmpeg_sec,
+    }
+
+
+def format_duration(seconds: float) -> str:
+    minutes, sec = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{sec:02d}" if hours else f"{minutes}:{sec:02d}"
+
+
+def print_plan(plan: dict, batch: int = 1):
+    print("[PLAN] 建置計畫（未連線語音服務，數字為估計）")
+    print(f"       音檔：需生成 {plan['herbs']} 個，已是最新而略過 {plan['skipped']} 個")
+    print(f"       語音片段：{plan['segments']} 段，不重複 {plan['unique_lines']} 句，"
+          f"重複 {plan['duplicate_lines']} 句")
+    print(f"       語音請求：快取已有 {plan['cached']} 個，需合成 {plan['requests']} 個"
+          + (f"（每次請求 {batch} 行）" if batch > 1 else ""))
+    print(f"       ffmpeg：約 {plan['ffmpeg_runs']} 次")
+    if plan['herbs']:
+        print(f"       音訊長度：共 {format_duration(plan['audio_sec'])}，"
+              f"平均每個 {format_duration(plan['audio_sec'] / plan['herbs'])}")
+    print(f"       預估耗時：約 {format_duration(plan['wall_sec'])}"
+          f"（語音合成 {format_duration(plan['tts_sec'])}，解碼編碼 {format_duration(plan['ffmpeg_sec'])}）")
+
+
+# ============================================================================
+# 建置指標
+# ============================================================================
+
+def prometheus_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    quote = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{quote(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_value(value) -> str:
+    # 整數照原樣輸出，浮點數保留完整精度（時間戳記與位元組數不能變成科學記號）
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def prometheus_metric(name: str, kind: str, help_text: str, samples: list) -> list:
+    """一個指標的 Prometheus 文字格式；samples 為 [(標籤 dict, 數值), ...]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{prometheus_labels(labels)} {prometheus_value(value)}" for labels, value in samples]
+    return lines
+
+
+def prometheus_histogram(name: str, help_text: str, values: list, buckets: tuple) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for bound in buckets:
+        lines.append(f'{name}_bucket{{le="{bound:g}"}} {sum(1 for v in values if v <= bound)}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {len(values)}')
+    lines.append(f"{name}_sum {prometheus_value(sum(values))}")
+    lines.append(f"{name}_count {len(values)}")
+    return lines
+
+
+def herb_labels(result: dict, **labels) -> dict:
+    """草藥結果的指標標籤；調整長度的版本另有 minutes 標籤（標準長度沒有這個標籤）"""
+    labels = {"herb": result["herb"]['pinyin'], **labels}
+    if result.get("minutes") is not None:
+        labels["minutes"] = result["minutes"]
+    return labels
+
+
+def build_metrics(tts: TTSClient, results: list, elapsed_sec: float,
+                  renditions=DEFAULT_RENDITIONS) -> str:
+    """整理本次建置的指標（Prometheus textfile collector 格式）
+    
+    片段、請求與快取計數取自 tts；語音請求延遲與 ffmpeg 次數、耗時取自 TRACER
+    的區段（每個 ffmpeg 行程一個 ffmpeg.* 區段，串流階段的耗時為行程的存活時間，
+    包含等待輸入）；產出與失敗取自各草藥的結果紀錄，輸出大小依 renditions
+    列出的各個發佈版本分別統計。
+    """
+    lines = []
+    lines += prometheus_metric("meditation_build_duration_seconds", "gauge", "本次建置耗時",
+                               [({}, elapsed_sec)])
+    lines += prometheus_metric("meditation_build_timestamp_seconds", "gauge", "指標寫入時間",
+                               [({}, time.time())])
+    
+    status_counts = {"ok": 0, "failed": 0, "skipped": 0}
+    for r in results:
+        status = "ok" if r["output"] else "skipped" if r["skipped"] else "failed"
+        status_counts[status] += 1
+    lines += prometheus_metric("meditation_herbs", "gauge", "依結果分類的草藥數量",
+                               [({"status": k}, v) for k, v in status_counts.items()])
+    lines += prometheus_metric("meditation_herb_failed", "gauge", "生成失敗的草藥（值為 1）",
+                               [(herb_labels(r, id=r["herb"]['id']), 1)
+                                for r in results if not r["output"] and not r["skipped"]])
+    lines += prometheus_metric("meditation_herb_duration_seconds", "gauge", "單個草藥的生成耗時",
+                               [(herb_labels(r), r["elapsed"]) for r in results if r["output"]])
+    output_bytes = dict.fromkeys([*renditions, "mp3"], 0)
+    for r in results:
+        if r["output"]:
+            for name, path in rendition_paths(r["output"], output_bytes).items():
+                output_bytes[name] += path.stat().st_size
+    lines += prometheus_metric("meditation_output_bytes_total", "counter", "依格式分類的寫入音檔位元組數",
+                               [({"format": k}, v) for k, v in output_bytes.items()])
+    
+    lines += prometheus_metric("meditation_tts_segments_total", "counter", "需要的語音片段數",
+                               [({}, tts.segments)])
+    lines += prometheus_metric("meditation_tts_requests_total", "counter", "實際送出的語音請求數",
+                               [({}, tts.requests)])
+    lines += prometheus_metric("meditation_tts_retries_total", "counter", "語音請求重試次數",
+                               [({}, tts.retried)])
+    if tts.cache is not None:
+        lines += prometheus_metric("meditation_tts_cache_requests_total", "counter", "語音快取查詢次數",
+                                   [({"result": "hit"}, tts.cache.hits), ({"result": "miss"}, tts.cache.misses)])
+    if isinstance(tts.limiter, AdaptiveLimiter):
+        lines += prometheus_metric("meditation_tts_concurrency_limit", "gauge", "自動調整的語音並行上限",
+                                   [({}, tts.limiter.limit)])
+    
+    latencies = [end - start for name, _, start, end, _ in TRACER.spans
+                 if name in ("tts.synthesize", "tts.stream")]
+    lines += prometheus_histogram("meditation_tts_request_duration_seconds",
+                                  "語音請求延遲（含失敗的嘗試）", latencies, TTS_LATENCY_BUCKETS)
+    
+    ffmpeg = {}
+    for name, _, start, end, _ in TRACER.spans:
+        if name.startswith("ffmpeg."):
+            stage = ffmpeg.setdefault(name.split(".", 1)[1], [0, 0.0])
+            stage[0] += 1
+            stage[1] += end - start
+    lines += prometheus_metric("meditation_ffmpeg_runs_total", "counter", "ffmpeg 執行次數",
+                               [({"stage": k}, v[0]) for k, v in sorted(ffmpeg.items())])
+    lines += prometheus_metric("meditation_ffmpeg_seconds_total", "counter", "ffmpeg 行程累計存活時間",
+                               [({"stage": k}, v[1]) for k, v in sorted(ffmpeg.items())])
+    return "\n".join(lines) + "\n"
+
+
+def save_metrics(text: str, path: Path):
+    """寫入指標檔（先寫暫存檔再取代，收集器不會讀到半份檔案）"""
+    part_file = path.with_name(f".{path.name}.part")
+    part_file.write_text(text, encoding="utf-8")
+    os.replace(part_file, path)
+
+
 # ============================================================================
 # 主程式
 # ============================================================================
 
+def concurrency_arg(value: str):
+    return value if value == "auto" else int(value)
+
+
+def renditions_arg(value: str) -> tuple:
+    """以逗號分隔的發佈格式（依偏好順序）；MP3 是備援，未列出時自動加在最後"""
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in RENDITIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"不支援的格式：{', '.join(unknown)}"
+                                         f"（可用：{', '.join(RENDITIONS)}）")
+    return names if "mp3" in names else names + ("mp3",)
+
+
+def minutes_arg(value: str) -> tuple:
+    """以逗號分隔的冥想長度（分鐘），須為 MEDITATION_LENGTHS 之一"""
+    try:
+        lengths = tuple(dict.fromkeys(int(part) for part in value.split(",") if part.strip()))
+    except ValueError:
+        lengths = ()
+    if not lengths or any(minutes not in MEDITATION_LENGTHS for minutes in lengths):
+        raise argparse.ArgumentTypeError(f"長度須為 {', '.join(map(str, MEDITATION_LENGTHS))} 分鐘"
+                                         f"（可用逗號列出多種）：{value}")
+    return lengths
+
+
+def merge_main(shard_dirs: list):
+    """--merge：合併各分片的輸出；有缺漏或重複時不複製任何檔案並以錯誤結束"""
+    print(f"[MERGE] 合併 {len(shard_dirs)} 個分片到 {OUTPUT_DIR}")
+    try:
+        merged = merge_shards(shard_dirs)
+    except RuntimeError as e:
+        print("[X] 無法合併：")
+        for problem in str(e).splitlines():
+            print(f"       - {problem}")
+        sys.exit(1)
+    print(f"[OK] 已合併 {len(merged)} 個草藥")
+    merged_ids = {key.partition("@")[0] for key in merged}
+    uncovered = [herb for herb in CATALOGUE if str(herb['id']) not in merged_ids]
+    if uncovered:
+        print(f"[INFO] 有 {len(uncovered)} 個草藥不在任何分片中（分片時只選了部分草藥），保留原有檔案")
+
+
 async def main():
     # 設定輸出編碼
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     
     parser = argparse.ArgumentParser(description='生成草藥冥想音檔')
-    parser.add_argument('--start', type=int, default=1, help='起始草藥編號')
-    parser.add_argument('--end', type=int, default=54, help='結束草藥編號')
-    parser.add_argument('--herb', type=str, help='指定草藥名稱')
+    parser.add_argument('--start', type=int, default=CATALOGUE.first_id, help='起始草藥編號')
+    parser.add_argument('--end', type=int, default=CATALOGUE.last_id, help='結束草藥編號')
+    parser.add_argument('--herb', type=str, help='指定草藥名稱或拼音')
+    parser.add_argument('--season', choices=SEASONS, help='只生成指定季節的草藥（可與編號範圍並用）')
+    parser.add_argument('--minutes', type=minutes_arg,
+                        help='生成調整長度的版本（分鐘，可用逗號列出多種，例如 5,10）；省略時為標準長度')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='同時生成的草藥數量')
+    parser.add_argument('--tts-backend', choices=sorted(TTS_BACKENDS), default="edge",
+                        help='語音合成後端：edge 為線上 edge-tts；tone 為離線的可重現替代音')
+    parser.add_argument('--tts-concurrency', type=concurrency_arg, default=TTS_CONCURRENCY,
+                        help='同時進行的語音合成請求上限；auto 表示依延遲與限流自動調整')
+    parser.add_argument('--tts-batch', type=int, default=TTS_BATCH,
+                        help='每次語音請求合併的腳本行數，依斷詞時間切回各行（僅 pcm、stream 組合方式）')
+    parser.add_argument('--cache-dir', type=Path, default=CACHE_DIR, help='語音片段快取目錄')
+    parser.add_argument('--cache-size-mb', type=int, default=CACHE_MAX_MB, help='語音快取容量上限 (MB)')
+    parser.add_argument('--no-cache', action='store_true', help='不使用語音快取')
+    parser.add_argument('--force', action='store_true', help='忽略建置清單，重新生成所有選定的草藥')
+    parser.add_argument('--retries', type=int, default=TTS_RETRIES, help='語音請求失敗後的重試次數')
+    parser.add_argument('--max-failures', type=int, default=MAX_FAILURES,
+                        help='失敗的草藥達到此數量時停止（0 表示不限制）')
+    parser.add_argument('--plan', action='store_true',
+                        help='只列出建置計畫（片段、請求、ffmpeg 次數與預估時間），不合成也不載入 edge-tts')
+    parser.add_argument('--trace', type=Path, metavar='PATH',
+                        help='輸出 Chrome/Perfetto trace-event JSON，並列出各階段耗時統計')
+    parser.add_argument('--metrics', type=Path, metavar='PATH',
+                        help='寫入 Prometheus textfile 格式的建置指標（每完成一個草藥更新一次）')
+    parser.add_argument('--assembly', choices=sorted(ASSEMBLERS), default=ASSEMBLY,
+                        help='組合方式：graph 以 ffmpeg filter graph 組合；pcm 在記憶體內組合，不寫暫存檔；'
+                             'stream 邊合成邊解碼並送進編碼器')
+    parser.add_argument('--renditions', type=renditions_arg, default=DEFAULT_RENDITIONS,
+                        help='從無損母帶輸出的格式，依偏好順序以逗號分隔（預設 opus,aac,mp3；一定包含 mp3）')
+    parser.add_argument('--shard', type=shard_arg, metavar='i/N',
+                        help='多台機器分工：只生成第 i 份（共 N 份，依草藥編號輪流分配）')
+    parser.add_argument('--merge', type=Path, nargs='+', metavar='DIR',
+                        help='合併各分片機器的專案目錄（含建置清單與 public/meditations），檢查齊全後複製到輸出目錄')
     args = parser.parse_args()
+    if args.tts_batch > 1 and args.assembly == "graph":
+        parser.error("--tts-batch 需搭配 --assembly pcm 或 stream")
+    if args.merge and args.shard:
+        parser.error("--merge 不能與 --shard 並用")
+    
+    if args.merge:
+        merge_main(args.merge)
+        return
     
     print("=" * 70)
     print("[TCM] 正念日曆 - 草藥冥想音檔生成器")
     print("=" * 70)
-    print(f"\n語音：{VOICE}")
+    print(f"\n語音：{VOICE}（{args.tts_backend}）")
     print(f"語速：{RATE}")
+    print(f"並行：{args.jobs} 個草藥 / " + ("自動調整語音請求數" if args.tts_concurrency == "auto"
+                                          else f"{args.tts_concurrency} 個語音請求"))
+    print(f"組合：{args.assembly}" + (f"（每次請求 {args.tts_batch} 行）" if args.tts_batch > 1 else ""))
+    print(f"格式：{', '.join(args.renditions)}")
+    lengths = args.minutes or (None,)
+    print(f"長度：{', '.join(length_label(minutes) for minutes in lengths)}")
     print(f"輸出目錄：{OUTPUT_DIR}\n")
     
+    # ffmpeg 步驟在執行緒池中執行，池的大小依並行數調整
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(4, args.jobs * 2)))
+    
     # 建立輸出目錄
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    if not args.plan:
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
     
     # 確定要處理的草藥
-    herbs_to_process = []
-    
     if args.herb:
         # 指定草藥名稱
-        for herb in HERBS_DATABASE:
-            if herb['name'] == args.herb:
-                herbs_to_process.append(herb)
-                break
-        if not herbs_to_process:
+        herb = CATALOGUE.get(args.herb)
+        if herb is None:
             print(f"[X] 找不到草藥：{args.herb}")
             return
+        herbs_to_process = [herb]
     else:
         # 範圍處理
-        for herb in HERBS_DATABASE:
-            if args.start <= herb['id'] <= args.end:
-                herbs_to_process.append(herb)
+        herbs_to_process = CATALOGUE.range(args.start, args.end)
+        if args.season:
+            herbs_to_process = [h for h in herbs_to_process if h['season'] == args.season]
+    
+    # 分片建置：只保留這台機器負責的草藥，並記在建置清單中供合併時檢查
+    shard = None
+    if args.shard:
+        herbs_to_process = [h for h in herbs_to_process if args.shard.owns(h)]
+        shard = {"index": args.shard.index, "count": args.shard.count,
+                 "herbs": [h['id'] for h in herbs_to_process], "lengths": list(lengths)}
+        print(f"[SHARD] 分片 {args.shard}：負責 {len(herbs_to_process)} 個草藥")
+    
+    if args.no_cache:
+        # 不使用快取時，已合成的片段仍暫存在斷點目錄中，供中斷後繼續使用
+        cache = TTSCache(TEMP_DIR / "checkpoint", max_bytes=sys.maxsize)
+    else:
+        cache = TTSCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    backend = TTS_BACKENDS[args.tts_backend]()
+    tts = TTSClient(args.tts_concurrency, cache, retries=args.retries, backend=backend,
+                    batch=args.tts_batch)
     
-    total = len(herbs_to_process)
+    # 每個草藥的每種長度各是一個輸出；跳過輸入沒有改變的
+    manifest = load_manifest()
+    builds = [(herb, minutes) for herb in herbs_to_process for minutes in lengths]
+    if not args.force:
+        fresh = [(h, m) for h, m in builds
+                 if is_up_to_date(h, manifest, herb_build_hash(h, tts, args.assembly, args.renditions, m), m)]
+        if fresh:
+            print(f"[SKIP] {len(fresh)} 個音檔已是最新（使用 --force 強制重新生成）")
+        builds = [build for build in builds if build not in fresh]
+    
+    if args.plan:
+        skipped = len(herbs_to_process) * len(lengths) - len(builds)
+        print_plan(plan_build(builds, tts, args.assembly, args.jobs, skipped, args.renditions),
+                   args.tts_batch)
+        return
+    if shard is not None:
+        save_manifest(manifest, shard=shard)
+    
+    total = len(builds)
     print(f"將生成 {total} 個冥想音檔\n")
     print("-" * 70)
     
-    start_time = datetime.now()
-    success_count = 0
+    def record(result):
+        # 每完成一個就更新清單，中途中斷也不會遺失已完成的紀錄；
+        # 調整長度的腳本依合成後的實際長度而定，雜湊在完成後才計算
+        if result["output"]:
+            herb, minutes = result["herb"], result["minutes"]
+            manifest[manifest_key(herb['id'], minutes)] = manifest_entry(
+                result["output"], herb_build_hash(herb, tts, args.assembly, args.renditions, minutes),
+                args.renditions)
+            save_manifest(manifest, shard=shard)
+            save_renditions(manifest)
+        if args.metrics:
+            finished.append(result)
+            save_metrics(build_metrics(tts, finished, (datetime.now() - start_time).total_seconds(),
+                                       args.renditions), args.metrics)
     
-    for i, herb in enumerate(herbs_to_process):
-        print(f"\n[{i+1:2d}/{total}] [herb] {herb['name']} ({herb['pinyin']}) - {herb['effect']}")
-        
-        try:
-            output_file = await generate_herb_meditation(herb)
-            
-            if output_file.exists():
-                file_size = output_file.stat().st_size / 1024
-                print(f"       [OK] 完成：{output_file.name} ({file_size:.0f} KB)")
-                success_count += 1
-            else:
-                print(f"       [X] 生成失敗")
-        except Exception as e:
-            print(f"       [X] 錯誤：{str(e)}")
-    
-    # 清理暫存目錄
+    finished = []
+    start_time = datetime.now()
     try:
-        for f in TEMP_DIR.glob("*"):
-            if f.is_file():
-                f.unlink()
-        TEMP_DIR.rmdir()
-    except:
-        pass
+        results = await render_herbs(builds, args.jobs, tts, on_result=record,
+                                     max_failures=args.max_failures, assembly=args.assembly,
+                                     renditions=args.renditions)
+    finally:
+        await backend.close()
+    success_count = sum(1 for r in results if r["output"])
+    if args.metrics:
+        save_metrics(build_metrics(tts, results, (datetime.now() - start_time).total_seconds(),
+                                   args.renditions), args.metrics)
+    
+    # 全部成功才清理暫存目錄（含斷點），否則保留供下次繼續
+    if success_count == total:
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
     
     # 總結
     elapsed = datetime.now() - start_time
@@ -546,12 +2388,34 @@ async def main():
     print("=" * 70)
     print(f"\n[OK] 成功：{success_count}/{total}")
     print(f"[TIME] 耗時：{elapsed}")
+    print(f"[TTS] 語音片段：{tts.segments}，實際請求：{tts.requests}，重試：{tts.retried}")
+    if isinstance(tts.limiter, AdaptiveLimiter):
+        latency = f"{tts.limiter.latency:.2f} 秒" if tts.limiter.latency is not None else "-"
+        print(f"[TTS] 自動並行：目前上限 {tts.limiter.limit}，最高 {tts.limiter.peak}，"
+              f"降速 {tts.limiter.decreases} 次，近期延遲 {latency}")
+    if isinstance(backend, EdgeTTSBackend) and edge_wire is not None:
+        print(f"[TTS] 連線：新建 {backend.pool.opened}，重用 {backend.pool.reused}"
+              + ("" if backend.pool.reuse else "（服務不接受重用，已改為每次請求新建連線）"))
+    if not args.no_cache:
+        print(f"[CACHE] 快取命中：{cache.hits}，快取目錄：{cache.cache_dir}")
     print(f"[DIR] 輸出目錄：{OUTPUT_DIR}")
     
+    if args.trace:
+        TRACER.write(args.trace)
+        print(f"\n[TRACE] 各階段耗時（秒，並行區段的累計會超過總耗時）：{args.trace}")
+        print(f"       {'stage':<20}{'count':>7}{'p50':>9}{'p95':>9}{'total':>10}")
+        for name, count, p50, p95, spent in TRACER.summary():
+            print(f"       {name:<20}{count:>7}{p50:>9.3f}{p95:>9.3f}{spent:>10.2f}")
+    
     if success_count == total:
         print("\n[SUCCESS] 所有冥想音檔已生成完成！")
     else:
         print(f"\n[WARN] 有 {total - success_count} 個檔案生成失敗")
+        for r in results:
+            if not r["output"]:
+                length = f"（{length_label(r['minutes'])}）" if r["minutes"] is not None else ""
+                print(f"       - {r['herb']['id']:02d} {r['herb']['name']}{length}：{r['error']}")
+        print("\n[RESUME] 重新執行相同的指令即可從中斷處繼續")
 
 
 if __name__ == "__main__":
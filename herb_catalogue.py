@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+================================================================================
+TCM 正念日曆 - 草藥目錄
+================================================================================
+
+草藥資料分成兩份，各草藥只在一處保存：
+    src/data/herbs.json    前端與生成器共用的欄位（編號、名稱、拼音、功效、季節），
+                           由 src/data/calendarData.js 打包進前端
+    herb_narration.json    冥想引導文字（visual / sensation / aroma），只有兩個
+                           冥想音檔生成器使用，不打包進前端
+載入時依編號合併成完整的草藥資料。
+
+目錄載入一次後建立索引，可依編號、名稱、拼音與季節查詢，並以編號範圍
+選取草藥：
+    catalogue = load_catalogue()
+    catalogue.get("薄荷")          # 名稱、拼音或編號
+    catalogue.range(1, 10)        # 編號 1 到 10
+    catalogue.season("冬")
+
+有 visual / sensation / aroma 引導文字的草藥才能生成冥想音檔，
+以 with_meditation() 取得；herbs.json 中這些草藥標記 "meditation": true，
+前端據此列出有音檔的草藥，載入時會檢查標記與引導文字一致。
+================================================================================
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from pathlib import Path
+
+CATALOGUE_PATH = Path(__file__).parent / "src" / "data" / "herbs.json"
+NARRATION_PATH = Path(__file__).parent / "herb_narration.json"
+SEASONS = ("冬", "春", "夏", "秋")
+MEDITATION_FIELDS = ("visual", "sensation", "aroma")
+
+
+class HerbCatalogue:
+    """依編號排序的草藥清單，附編號、名稱、拼音與季節索引"""
+    
+    def __init__(self, herbs: list):
+        self.herbs = sorted(herbs, key=lambda herb: herb['id'])
+        self._ids = [herb['id'] for herb in self.herbs]
+        self.by_id = {herb['id']: herb for herb in self.herbs}
+        self.by_name = {herb['name']: herb for herb in self.herbs}
+        self.by_pinyin = {herb['pinyin']: herb for herb in self.herbs}
+        self.by_season = {season: [] for season in SEASONS}
+        for herb in self.herbs:
+            self.by_season.setdefault(herb['season'], []).append(herb)
+        if len(self.by_id) != len(self.herbs):
+            raise ValueError("草藥目錄中有重複的編號")
+    
+    def __len__(self) -> int:
+        return len(self.herbs)
+    
+    def __iter__(self):
+        return iter(self.herbs)
+    
+    @property
+    def first_id(self) -> int:
+        return self._ids[0] if self._ids else 0
+    
+    @property
+    def last_id(self) -> int:
+        return self._ids[-1] if self._ids else 0
+    
+    def get(self, key):
+        """依編號、名稱或拼音查詢；找不到時回傳 None"""
+        if isinstance(key, int) or (isinstance(key, str) and key.isdigit()):
+            return self.by_id.get(int(key))
+        return self.by_name.get(key) or self.by_pinyin.get(key.lower())
+    
+    def range(self, start: int = None, end: int = None) -> list:
+        """編號在 [start, end] 之間的草藥（含兩端），省略時表示不限"""
+        low = 0 if start is None else bisect_left(self._ids, start)
+        high = len(self._ids) if end is None else bisect_right(self._ids, end)
+        return self.herbs[low:high]
+    
+    def season(self, season: str) -> list:
+        return list(self.by_season.get(season, []))
+    
+    def with_meditation(self) -> "HerbCatalogue":
+        """只包含有冥想引導文字、可以生成音檔的草藥"""
+        return HerbCatalogue([herb for herb in self.herbs
+                              if all(herb.get(field) for field in MEDITATION_FIELDS)])
+
+
+def merge_narration(herbs: list, narration: list) -> list:
+    """把引導文字依編號併入草藥資料，並移除只給前端用的 meditation 標記
+    
+    標記與引導文字不一致（有標記沒有文字、有文字沒有標記、文字對不到草藥）時
+    拋出 ValueError。
+    """
+    texts = {entry['id']: {field: entry[field] for field in MEDITATION_FIELDS} for entry in narration}
+    unknown = sorted(texts.keys() - {herb['id'] for herb in herbs})
+    if unknown:
+        raise ValueError(f"引導文字對應不到草藥：{', '.join(map(str, unknown))}")
+    merged = []
+    for herb in herbs:
+        herb = dict(herb)
+        if herb.pop("meditation", False) != (herb['id'] in texts):
+            raise ValueError(f"草藥 {herb['id']} 的 meditation 標記與引導文字不一致")
+        merged.append({**herb, **texts.get(herb['id'], {})})
+    return merged
+
+
+@lru_cache(maxsize=None)
+def load_catalogue(path: Path = CATALOGUE_PATH, narration_path: Path = NARRATION_PATH) -> HerbCatalogue:
+    """讀取草藥目錄並併入引導文字（同一組路徑只讀一次）"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    with open(narration_path, encoding="utf-8") as f:
+        narration = json.load(f)
+    return HerbCatalogue(merge_narration(data["herbs"], narration["herbs"]))
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+================================================================================
+TCM 正念日曆 - 冥想音檔即時生成服務
+================================================================================
+
+常駐的本機 HTTP 服務：某個草藥與語音設定的組合第一次被請求時才生成，
+邊合成邊編碼邊回傳；完成的音檔存入快取，之後直接回傳。多個請求同時要求
+同一個組合時只生成一次，所有請求共用同一份輸出。
+
+使用方式：
+    py meditation_server.py                              # http://127.0.0.1:8765
+    py meditation_server.py --port 9000 --jobs 4         # 最多同時生成4個音檔
+    py meditation_server.py --tts-backend tone           # 離線替代音（測試用）
+
+請求：
+    GET /meditations/<草藥>.mp3?voice=zh-TW-HsiaoChenNeural&rate=-15%25&pitch=-5Hz&minutes=10
+        草藥可用編號、名稱或拼音；voice、rate、pitch 省略時與批量生成器相同；
+        minutes 可為 3、5、10、20，省略時為標準長度。各種長度共用相同的語音片段，
+        只要標準長度生成過，其他長度不需要再合成語音
+    GET /status
+        服務統計（JSON）
+================================================================================
+"""
+
+import asyncio
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import generate_all_meditations as gam
+
+RENDER_CACHE_DIR = gam.SCRIPT_DIR / ".meditation_cache"
+RENDER_CACHE_MB = 2048   # 生成音檔快取容量上限
+RENDER_JOBS = 2          # 同時生成的音檔數量上限
+STREAM_CHUNK = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+# 參數格式與 edge-tts 相同
+VOICE_PATTERN = re.compile(r"^[A-Za-z]{2,3}-[A-Za-z]{2,4}-\w+$")
+RATE_PATTERN = re.compile(r"^[+-]\d+%$")
+PITCH_PATTERN = re.compile(r"^[+-]\d+Hz$")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+# ============================================================================
+# 生成與合併請求
+# ============================================================================
+
+class Render:
+    """一次進行中的生成：編碼器的輸出持續附加到 buffer，
+    等待同一個組合的每個請求都從頭讀取，直到生成結束"""
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Condition()
+    
+    async def append(self, data: bytes):
+        async with self._changed:
+            self.buffer += data
+            self._changed.notify_all()
+    
+    async def finish(self, error: BaseException = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+    
+    async def chunks(self):
+        """依序產生已輸出的資料；生成失敗時在送完已有的資料後拋出例外"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.buffer) > sent or self.done)
+                data = bytes(self.buffer[sent:])
+            if data:
+                sent += len(data)
+                yield data
+            elif self.error is not None:
+                raise self.error
+            else:
+                return
+
+
+def stream_encoder_cmd() -> list:
+    """從 stdin 讀取 PCM、把 MP3 寫到 stdout 的 ffmpeg 指令（設定與發佈用的 MP3 相同）"""
+    return [
+        "ffmpeg", "-v", "error",
+        "-f", "s16le", "-ac", "1", "-ar", str(gam.SAMPLE_RATE), "-i", "pipe:0",
+        *gam.RENDITIONS["mp3"]["args"],
+        "-f", "mp3", "pipe:1"
+    ]
+
+
+class MeditationService:
+    """依請求生成冥想音檔：查詢快取、合併相同組合的請求，並限制同時生成的數量
+    
+    所有語音設定共用同一個語音後端、語音片段快取與請求並行上限。
+    """
+    
+    def __init__(self, backend: gam.TTSBackend, tts_cache: gam.TTSCache, cache: gam.TTSCache,
+                 concurrency=gam.TTS_CONCURRENCY, retries: int = gam.TTS_RETRIES, jobs: int = RENDER_JOBS):
+        self.backend = backend
+        self.tts_cache = tts_cache
+        self.cache = cache
+        self.concurrency = concurrency
+        self.retries = retries
+        self.jobs = asyncio.Semaphore(max(1, jobs))
+        self.limiter = None
+        self.renders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self._clients = {}
+        self._pending = {}
+    
+    def client(self, voice: str, rate: str, pitch: str) -> gam.TTSClient:
+        """同一組語音設定共用一個 TTSClient；所有 TTSClient 共用第一個建立的並行限制"""
+        settings = (voice, rate, pitch)
+        if settings not in self._clients:
+            tts = gam.TTSClient(self.concurrency, self.tts_cache, retries=self.retries,
+                                backend=self.backend, voice=voice, rate=rate, pitch=pitch)
+            if self.limiter is None:
+                self.limiter = tts.limiter
+            tts.limiter = self.limiter
+            self._clients[settings] = tts
+        return self._clients[settings]
+    
+    def open(self, herb: dict, voice: str, rate: str, pitch: str, minutes: int = None):
+        """回傳 (快取的 MP3 資料, None) 或 (None, 進行中的 Render)"""
+        tts = self.client(voice, rate, pitch)
+        key = gam.herb_build_hash(herb, tts, "stream", ("mp3",), minutes)
+        data = self.cache.get(key)
+        if data is not None:
+            return data, None
+        
+        render = self._pending.get(key)
+        if render is not None:
+            self.coalesced += 1
+        else:
+            render = Render()
+            self._pending[key] = render
+            # 生成在獨立的工作中進行，請求中斷時其他等待者仍能取得結果並寫入快取
+            task = asyncio.ensure_future(self._render(herb, tts, render, minutes))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return None, render
+    
+    async def _render(self, herb: dict, tts: gam.TTSClient, render: Render, minutes: int = None):
+        async with self.jobs:
+            self.renders += 1
+            async def drain_output(encoder):
+                while chunk := await encoder.stdout.read(STREAM_CHUNK):
+                    await render.append(chunk)
+            
+            try:
+                with gam.TRACER.span("serve.render", herb=herb['pinyin'], minutes=minutes):
+                    # 調整長度時先取得各句的實際長度（未快取的先合成），腳本才會接近指定長度
+                    durations = await tts.durations(gam.speech_lines(herb)) if minutes is not None else None
+                    script = gam.generate_meditation_script(herb, minutes, durations)
+                    async with gam.ffmpeg_process("stream_encode", stream_encoder_cmd(),
+                                                  stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                                                  stderr=asyncio.subprocess.PIPE) as encoder:
+                        reader = asyncio.ensure_future(drain_output(encoder))
+                        try:
+                            writer = gam.FadingPCMWriter(encoder.stdin)
+                            await gam.write_script_pcm(script, tts, writer)
+                            await writer.close()
+                            await reader
+                            stderr = await encoder.stderr.read()
+                            if await encoder.wait() != 0:
+                                raise RuntimeError(f"編碼失敗：{stderr.decode(errors='replace').strip()}")
+                        finally:
+                            reader.cancel()
+                # 以實際使用的腳本重新計算鍵：句子剛合成時，請求當下算出的鍵用的是估計長度
+                self.cache.put(gam.herb_build_hash(herb, tts, "stream", ("mp3",), minutes), bytes(render.buffer))
+                await render.finish()
+            except BaseException as e:
+                self.failures += 1
+                await render.finish(e if isinstance(e, Exception) else RuntimeError("生成已取消"))
+                if not isinstance(e, Exception):
+                    raise
+                print(f"[X] {herb['name']} 生成失敗：{e}")
+    
+    def status(self) -> dict:
+        limit = self.limiter.limit if isinstance(self.limiter, gam.AdaptiveLimiter) else self.concurrency
+        return {
+            "renders": self.renders,
+            "rendering": len(self._pending),
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "tts_requests": sum(tts.requests for tts in self._clients.values()),
+            "tts_concurrency": limit,
+        }
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+class BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def meditation_params(herb_key: str, query: dict) -> tuple:
+    """解析草藥、語音與長度參數，格式錯誤或找不到草藥時拋出 BadRequest"""
+    herb = gam.CATALOGUE.get(herb_key)
+    if herb is None:
+        raise BadRequest(404, f"找不到草藥或沒有冥想引導文字：{herb_key}")
+    voice = query.get("voice", [gam.VOICE])[0]
+    rate = query.get("rate", [gam.RATE])[0]
+    pitch = query.get("pitch", [gam.PITCH])[0]
+    for name, value, pattern in (("voice", voice, VOICE_PATTERN), ("rate", rate, RATE_PATTERN),
+                                 ("pitch", pitch, PITCH_PATTERN)):
+        if not pattern.match(value):
+            raise BadRequest(400, f"{name} 格式錯誤：{value}")
+    minutes = query.get("minutes", [None])[0]
+    if minutes is not None:
+        if not minutes.isdigit() or int(minutes) not in gam.MEDITATION_LENGTHS:
+            raise BadRequest(400, f"minutes 必須是 {'、'.join(map(str, gam.MEDITATION_LENGTHS))} 之一：{minutes}")
+        minutes = int(minutes)
+    return herb, voice, rate, pitch, minutes
+
+
+def response_head(status: int, headers: dict) -> bytes:
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+    headers = {"Access-Control-Allow-Origin": "*", "Connection": "close", **headers}
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+async def send_body(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str, **headers):
+    writer.write(response_head(status, {"Content-Type": content_type,
+                                        "Content-Length": len(body), **headers}))
+    writer.write(body)
+    await writer.drain()
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, payload: dict, **headers):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send_body(writer, status, body, "application/json; charset=utf-8", **headers)
+
+
+async def send_stream(writer: asyncio.StreamWriter, render: Render):
+    """以 chunked 傳輸邊生成邊回傳；生成失敗時直接中斷連線，客戶端會看到不完整的回應"""
+    writer.write(response_head(200, {"Content-Type": "audio/mpeg", "Transfer-Encoding": "chunked",
+                                     "Cache-Control": "no-cache"}))
+    async for chunk in render.chunks():
+        writer.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def handle(service: MeditationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        
+        if method != "GET":
+            await send_json(writer, 405, {"error": "只支援 GET"}, Allow="GET")
+        elif url.path == "/status":
+            await send_json(writer, 200, service.status())
+        elif url.path.startswith("/meditations/") and url.path.endswith(".mp3"):
+            herb_key = unquote(url.path[len("/meditations/"):-len(".mp3")])
+            data, render = service.open(*meditation_params(herb_key, query))
+            if data is not None:
+                await send_body(writer, 200, data, "audio/mpeg", **{"Cache-Control": "max-age=86400"})
+            else:
+                await send_stream(writer, render)
+        else:
+            raise BadRequest(404, f"沒有這個路徑：{url.path}")
+    except BadRequest as e:
+        await send_json(writer, e.status, {"error": str(e)})
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        pass  # 連線提早關閉或請求格式錯誤
+    except ConnectionError:
+        pass  # 客戶端中途離開，生成仍會繼續並寫入快取
+    except Exception as e:
+        print(f"[X] 處理請求失敗：{e}")
+    finally:
+        writer.close()
+
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+async def main():
+    # 設定輸出編碼
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace', line_buffering=True)
+    
+    parser = argparse.ArgumentParser(description='冥想音檔即時生成服務')
+    parser.add_argument('--host', default="127.0.0.1", help='監聽位址')
+    parser.add_argument('--port', type=int, default=8765, help='監聽埠')
+    parser.add_argument('--jobs', '-j', type=int, default=RENDER_JOBS, help='同時生成的音檔數量上限')
+    parser.add_argument('--tts-backend', choices=sorted(gam.TTS_BACKENDS), default="edge",
+                        help='語音合成後端：edge 為線上 edge-tts；tone 為離線的可重現替代音')
+    parser.add_argument('--tts-concurrency', type=gam.concurrency_arg, default=gam.TTS_CONCURRENCY,
+                        help='所有生成共用的語音合成請求上限；auto 表示依延遲與限流自動調整')
+    parser.add_argument('--retries', type=int, default=gam.TTS_RETRIES, help='語音請求失敗後的重試次數')
+    parser.add_argument('--tts-cache-dir', type=Path, default=gam.CACHE_DIR, help='語音片段快取目錄')
+    parser.add_argument('--cache-dir', type=Path, default=RENDER_CACHE_DIR, help='生成音檔快取目錄')
+    parser.add_argument('--cache-size-mb', type=int, default=RENDER_CACHE_MB, help='生成音檔快取容量上限 (MB)')
+    args = parser.parse_args()
+    
+    # 服務不輸出 trace，改用不記錄的 tracer，避免區段與分軌隨請求數無限增長
+    gam.TRACER = gam.NullTracer()
+    backend = gam.TTS_BACKENDS[args.tts_backend]()
+    service = MeditationService(
+        backend,
+        gam.TTSCache(args.tts_cache_dir),
+        gam.TTSCache(args.cache_dir, args.cache_size_mb * 1024 * 1024),
+        concurrency=args.tts_concurrency, retries=args.retries, jobs=args.jobs)
+    server = await asyncio.start_server(lambda r, w: handle(service, r, w), args.host, args.port,
+                                        limit=MAX_HEADER_BYTES)
+    
+    print("=" * 70)
+    print("[TCM] 正念日曆 - 冥想音檔即時生成服務")
+    print("=" * 70)
+    print(f"\n語音後端：{args.tts_backend}，同時生成：{args.jobs} 個")
+    print(f"快取目錄：{args.cache_dir}")
+    print(f"[SERVE] http://{args.host}:{args.port}/meditations/<草藥>.mp3\n")
+    
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await backend.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+================================================================================
+TCM 正念日曆 - 草藥圖片最佳化
+================================================================================
+
+把 public/herbs 下的原始 PNG 轉成多種寬度的 AVIF 與 WebP，檔名帶內容雜湊
+（可長期快取），並寫出 src/data/imageVariants.json 供前端組成 srcset。
+各版本以多個行程並行編碼；原圖與設定都沒有改變的圖片直接沿用上次的結果。
+
+使用方式：
+    py optimize_herb_images.py                 # 處理所有有變動的圖片
+    py optimize_herb_images.py --jobs 4        # 最多4個行程並行編碼
+    py optimize_herb_images.py --formats webp  # 只輸出 WebP
+    py optimize_herb_images.py --force         # 忽略清單，全部重新編碼
+
+輸出：public/herbs/optimized/<原檔名>.<寬度>.<雜湊>.avif / .webp
+      src/data/imageVariants.json
+需要 Pillow（pip install Pillow）；Pillow 不支援 AVIF 時只輸出 WebP。
+================================================================================
+"""
+
+import io
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None  # 沒有 Pillow 時無法轉檔，main() 會提示安裝
+
+
+# ============================================================================
+# 設定
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+PUBLIC_DIR = SCRIPT_DIR / "public"
+SOURCE_DIR = PUBLIC_DIR / "herbs"
+OUTPUT_DIR = SOURCE_DIR / "optimized"
+MANIFEST_PATH = SCRIPT_DIR / "src" / "data" / "imageVariants.json"
+
+# 縮圖在頁面上顯示約 40–64 px，依 1x–3x 螢幕準備；768 供燈箱放大檢視
+WIDTHS = (96, 192, 384, 768)
+
+# 輸出格式，依偏好順序排列（前端的 <picture> 依此順序列出 <source>）
+FORMATS = {
+    "avif": {"ext": ".avif", "type": "image/avif", "options": {"quality": 50, "speed": 6}},
+    "webp": {"ext": ".webp", "type": "image/webp", "options": {"quality": 80, "method": 6}},
+}
+
+# 編碼流程有改動時遞增，讓所有圖片重新編碼
+PIPELINE_VERSION = 1
+
+
+# ============================================================================
+# 編碼（在子行程中執行）
+# ============================================================================
+
+def variant_widths(width: int) -> list:
+    """原圖寬度為 width 時要輸出的寬度：不放大，超過原圖的寬度以原圖寬度取代"""
+    return sorted({min(w, width) for w in WIDTHS})
+
+
+def encode_variant(source: Path, width: int, fmt: str) -> dict:
+    """把原圖縮到 width 寬並編碼成 fmt，以內容雜湊命名寫入 OUTPUT_DIR"""
+    with Image.open(source) as image:
+        image.load()
+        # 完全不透明的 RGBA 去掉 alpha 通道，編碼後較小
+        if image.mode == "RGBA" and image.getextrema()[3] == (255, 255):
+            image = image.convert("RGB")
+        height = round(image.height * width / image.width)
+        if width != image.width:
+            image = image.resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, fmt.upper(), **FORMATS[fmt]["options"])
+    
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    output_file = OUTPUT_DIR / f"{source.stem}.{width}.{digest}{FORMATS[fmt]['ext']}"
+    if not output_file.exists():
+        part_file = output_file.with_name(output_file.name + ".part")
+        part_file.write_bytes(data)
+        os.replace(part_file, output_file)
+    
+    return {
+        "format": fmt,
+        "src": output_file.relative_to(PUBLIC_DIR).as_posix(),
+        "width": width,
+        "height": height,
+        "bytes": len(data),
+    }
+
+
+# ============================================================================
+# 清單
+# ============================================================================
+
+def source_hash(source: Path, formats: list) -> str:
+    """原圖內容與所有編碼設定的雜湊，任何一項改變都會重新編碼"""
+    settings = {
+        "widths": WIDTHS,
+        "formats": {fmt: FORMATS[fmt] for fmt in formats},
+        "pipeline": PIPELINE_VERSION,
+    }
+    digest = hashlib.sha256(source.read_bytes())
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    """讀取圖片清單 {原圖路徑: {hash, width, height, sources}}；不存在或損毀時回傳空清單"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("images", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(entries: dict, path: Path = MANIFEST_PATH):
+    """寫入圖片清單（先寫暫存檔再取代，避免中斷時留下半份檔案）"""
+    part_file = path.with_suffix(".json.part")
+    with open(part_file, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "images": dict(sorted(entries.items()))}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(part_file, path)
+
+
+def is_up_to_date(entry: dict, build_hash: str) -> bool:
+    """清單中的雜湊相符且所有版本檔仍存在時視為最新"""
+    if not entry or entry.get("hash") != build_hash:
+        return False
+    return all((PUBLIC_DIR / variant["src"]).exists()
+               for variants in entry["sources"].values() for variant in variants)
+
+
+def remove_orphans(entries: dict) -> int:
+    """刪除 OUTPUT_DIR 中不再被清單引用的舊版本，回傳刪除的檔案數"""
+    referenced = {variant["src"] for entry in entries.values()
+                  for variants in entry["sources"].values() for variant in variants}
+    removed = 0
+    for path in OUTPUT_DIR.iterdir():
+        if path.relative_to(PUBLIC_DIR).as_posix() not in referenced:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+# ============================================================================
+# 主程式
+# ============================================================================
+
+def formats_arg(value: str) -> list:
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in FORMATS]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(f"不支援的格式：{', '.join(unknown) or value}"
+                                         f"（可用：{', '.join(FORMATS)}）")
+    return names
+
+
+def main():
+    # 設定輸出編碼
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    
+    parser = argparse.ArgumentParser(description='把草藥圖片轉成響應式 AVIF / WebP 版本')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='並行編碼的行程數')
+    parser.add_argument('--formats', type=formats_arg, default=list(FORMATS),
+                        help='輸出格式，依偏好順序以逗號分隔（預設 avif,webp）')
+    parser.add_argument('--force', action='store_true', help='忽略清單，重新編碼所有圖片')
+    args = parser.parse_args()
+    
+    if Image is None:
+        print("[X] 需要 Pillow：pip install Pillow")
+        sys.exit(1)
+    formats = args.formats
+    if "avif" in formats and not features.check("avif"):
+        print("[WARN] 此 Pillow 不支援 AVIF，只輸出其他格式")
+        formats = [fmt for fmt in formats if fmt != "avif"]
+        if not formats:
+            sys.exit(1)
+    
+    print("=" * 70)
+    print("[TCM] 正念日曆 - 草藥圖片最佳化")
+    print("=" * 70)
+    print(f"\n格式：{', '.join(formats)}，寬度：{', '.join(map(str, WIDTHS))}")
+    print(f"並行：{args.jobs} 個行程")
+    print(f"輸出目錄：{OUTPUT_DIR}\n")
+    
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    sources = sorted(SOURCE_DIR.glob("*.png"))
+    manifest = {} if args.force else load_manifest()
+    entries = {}
+    pending = {}
+    for source in sources:
+        key = source.relative_to(PUBLIC_DIR).as_posix()
+        build_hash = source_hash(source, formats)
+        if is_up_to_date(manifest.get(key), build_hash):
+            entries[key] = manifest[key]
+        else:
+            with Image.open(source) as image:
+                width, height = image.size
+            entries[key] = {"hash": build_hash, "width": width, "height": height,
+                            "sources": {fmt: [] for fmt in formats}}
+            pending[key] = source
+    
+    if len(entries) > len(pending):
+        print(f"[SKIP] {len(entries) - len(pending)} 張圖片已是最新（使用 --force 強制重新編碼）")
+    print(f"將處理 {len(pending)} 張圖片\n")
+    print("-" * 70)
+    
+    start_time = datetime.now()
+    failed = []
+    # 每個（圖片、寬度、格式）都是獨立工作，AVIF 較慢也能平均分散到各行程
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {
+            pool.submit(encode_variant, source, width, fmt): key
+            for key, source in pending.items()
+            for width in variant_widths(entries[key]["width"])
+            for fmt in formats
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                variant = future.result()
+            except Exception as e:
+                print(f"       [X] {key}：{e}")
+                failed.append(key)
+                continue
+            entries[key]["sources"][variant.pop("format")].append(variant)
+    
+    for key in pending:
+        if key in failed:
+            # 失敗的圖片不寫入清單，前端改用原圖
+            entries.pop(key)
+            continue
+        for variants in entries[key]["sources"].values():
+            variants.sort(key=lambda variant: variant["width"])
+        original = (PUBLIC_DIR / key).stat().st_size
+        optimized = {fmt: sum(v["bytes"] for v in variants)
+                     for fmt, variants in entries[key]["sources"].items()}
+        sizes = "，".join(f"{fmt} {size / 1024:.0f} KB" for fmt, size in optimized.items())
+        print(f"[OK] {key}（原圖 {original / 1024:.0f} KB → {sizes}，所有寬度合計）")
+    
+    save_manifest(entries)
+    removed = remove_orphans(entries)
+    
+    # 總結
+    print("\n" + "=" * 70)
+    print("[DONE] 圖片最佳化完成！")
+    print("=" * 70)
+    print(f"\n[OK] 成功：{len(pending) - len(set(failed))}/{len(pending)}")
+    print(f"[TIME] 耗時：{datetime.now() - start_time}")
+    if removed:
+        print(f"[CLEAN] 刪除 {removed} 個舊版本檔案")
+    print(f"[FILE] 清單：{MANIFEST_PATH}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import { motion, AnimatePresence } from 'framer-motion';
 import { ChevronLeft, ChevronRight, Calendar as CalendarIcon } from 'lucide-react';
 import { useState, useMemo } from 'react';
-import { herbImages } from '../data/calendarData';
+import { herbImages, parseLocalDate } from '../data/calendarData';
+import ResponsiveImage from './ResponsiveImage';
 
 // 藥材 emoji 映射
 const herbEmojis = {
@@ -85,7 +86,7 @@ export default function CalendarView({
   const getTermForDay = (day) => {
     if (!day.isCurrentMonth) return null;
     return monthSolarTerms.find(t => 
-      new Date(t.date).getDate() === day.date.getDate()
+      parseLocalDate(t.date).getDate() === day.date.getDate()
     );
   };
 
@@ -147,7 +148,7 @@ export default function CalendarView({
                   term.season === '秋' ? 'bg-orange-300' :
                   'bg-blue-300'
                 }`}></span>
-                {term.name} {new Date(term.date).getDate()}日
+                {term.name} {parseLocalDate(term.date).getDate()}日
               </div>
             ))}
           </div>
@@ -278,7 +279,7 @@ export default function CalendarView({
                 </div>
                 {(() => {
                   const term = monthSolarTerms.find(t => 
-                    new Date(t.date).getDate() === selectedDate.getDate()
+                    parseLocalDate(t.date).getDate() === selectedDate.getDate()
                   );
                   return term ? (
                     <span className="bg-blue-100 text-blue-600 px-3 py-1 rounded-full text-sm font-medium">
@@ -292,8 +293,9 @@ export default function CalendarView({
                 <div className="flex items-center gap-3 p-3 bg-gradient-to-r from-amber-50 to-orange-50 rounded-xl">
                   <div className="w-14 h-14 bg-white rounded-lg flex items-center justify-center shadow-sm overflow-hidden">
                     {getHerbImagePath(selectedDayData.herb.name) ? (
-                      <img 
+                      <ResponsiveImage 
                         src={getHerbImagePath(selectedDayData.herb.name)}
+                        sizes="48px"
                         alt={selectedDayData.herb.name}
                         className="w-12 h-12 object-contain"
                         onError={(e) => {
@@ -2,6 +2,7 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { Search, Heart, Grid3X3, List, SlidersHorizontal } from 'lucide-react';
 import { useState, useMemo } from 'react';
 import { herbImages } from '../data/calendarData';
+import ResponsiveImage from './ResponsiveImage';
 import { useUserStats } from '../hooks/useUserStats';
 
 // 藥材拉丁學名對照表
@@ -300,8 +301,9 @@ export default function HerbsView({ herbsDatabase, onSelectHerb }) {
                     {/* 圖片區域 */}
                     <div className="relative bg-gradient-to-br from-amber-50 to-orange-50 p-4 flex items-center justify-center h-24">
                       {imagePath ? (
-                        <img
+                        <ResponsiveImage
                           src={imagePath}
+                          sizes="64px"
                           alt={herb.name}
                           className="w-16 h-16 object-contain"
                           onError={(e) => { e.target.style.display = 'none'; }}
@@ -378,8 +380,9 @@ export default function HerbsView({ herbsDatabase, onSelectHerb }) {
                     {/* 縮圖 */}
                     <div className="w-14 h-14 bg-gradient-to-br from-amber-50 to-orange-50 rounded-xl flex items-center justify-center flex-shrink-0">
                       {imagePath ? (
-                        <img
+                        <ResponsiveImage
                           src={imagePath}
+                          sizes="40px"
                           alt={herb.name}
                           className="w-10 h-10 object-contain"
                           onError={(e) => { e.target.style.display = 'none'; }}
@@ -1,6 +1,7 @@
 import { useState } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { X, ZoomIn } from 'lucide-react';
+import ResponsiveImage from './ResponsiveImage';
 
 /**
  * 圖片燈箱組件 - 點擊放大查看圖片
@@ -45,8 +46,9 @@ export default function ImageLightbox({ isOpen, onClose, imageSrc, imageAlt, tit
             
             {/* 圖片 */}
             <div className="bg-white rounded-2xl overflow-hidden shadow-2xl p-2">
-              <img 
+              <ResponsiveImage 
                 src={imageSrc}
+                sizes="85vw"
                 alt={imageAlt}
                 className="max-w-[85vw] max-h-[70vh] object-contain rounded-xl"
               />
@@ -88,7 +90,7 @@ export function ZoomableImage({ src, alt, className, title, subtitle, children }
         onClick={() => setIsOpen(true)}
       >
         {children || (
-          <img src={src} alt={alt} className={className} />
+          <ResponsiveImage src={src} alt={alt} className={className} />
         )}
         {/* 放大提示圖標 */}
         <div className="absolute bottom-2 right-2 opacity-0 group-hover:opacity-100 transition-opacity bg-white/90 rounded-full p-1.5 shadow-lg">
@@ -1,19 +1,34 @@
-import React, { useState, useRef, useEffect, useCallback } from 'react';
+import React, { useState, useRef, useEffect, useCallback, useMemo } from 'react';
 import { Play, Pause, RotateCcw, Volume2, VolumeX, SkipBack, SkipForward } from 'lucide-react';
 
+const NO_SOURCES = [];
+
 /**
  * TCM 草藥冥想音頻播放器
  * 提供完整的冥想音頻播放功能：播放/暫停、進度控制、音量調節
+ * sources 為依偏好順序排列的音檔版本 [{ src, type }]，播放瀏覽器支援的第一個；
+ * 都不支援或未提供時播放 audioSrc。sources 為 null 表示版本清單仍在載入，
+ * 此時不建立 <audio>，以免清單載入後換成另一個格式時中斷已開始的播放
  */
 const MeditationPlayer = ({ 
   herbName, 
   audioSrc, 
+  sources = NO_SOURCES,
   herbEffect,
   seasonColor = { primary: '#6B8E6B', secondary: '#C4A484' },
   onComplete = null  // 冥想完成回調
 }) => {
   const audioRef = useRef(null);
   const progressRef = useRef(null);
+
+  // 挑選瀏覽器能播放的音檔版本（清單載入前為 null）
+  const sourcesPending = sources === null;
+  const src = useMemo(() => {
+    if (sourcesPending) return null;
+    const probe = typeof document !== 'undefined' ? document.createElement('audio') : null;
+    const playable = probe && sources.find(({ type }) => probe.canPlayType(type) !== '');
+    return playable ? playable.src : audioSrc;
+  }, [sourcesPending, sources, audioSrc]);
   
   // 播放器狀態
   const [isPlaying, setIsPlaying] = useState(false);
@@ -177,7 +192,7 @@ const MeditationPlayer = ({
       audio.removeEventListener('waiting', handleWaiting);
       audio.removeEventListener('playing', handlePlaying);
     };
-  }, [audioSrc, volume, onComplete, herbName]);
+  }, [src, volume, onComplete, herbName]);
 
   // 當音頻源改變時重置狀態
   useEffect(() => {
@@ -189,7 +204,7 @@ const MeditationPlayer = ({
     setDuration(0);
     setIsLoading(true);
     setError(null);
-  }, [audioSrc]);
+  }, [src]);
 
   // 鍵盤快捷鍵
   useEffect(() => {
@@ -223,7 +238,7 @@ const MeditationPlayer = ({
   const progress = duration > 0 ? (currentTime / duration) * 100 : 0;
 
   // 無音頻源時的提示
-  if (!audioSrc) {
+  if (!src && !sourcesPending) {
     return (
       <div className="bg-gradient-to-r from-gray-50 to-gray-100 rounded-2xl p-6 text-center">
         <div className="w-16 h-16 mx-auto mb-3 rounded-full bg-gray-200 flex items-center justify-center">
@@ -249,12 +264,14 @@ const MeditationPlayer = ({
         <p className="text-sm text-gray-600">{herbEffect}</p>
       </div>
 
-      {/* 隱藏的音頻元素 */}
-      <audio 
-        ref={audioRef} 
-        src={audioSrc} 
-        preload="metadata"
-      />
+      {/* 隱藏的音頻元素（音檔版本確定後才建立） */}
+      {src && (
+        <audio 
+          ref={audioRef} 
+          src={src} 
+          preload="metadata"
+        />
+      )}
 
       {/* 視覺化波形區域 */}
       <div className="relative h-20 mb-4 rounded-xl overflow-hidden bg-white/30 backdrop-blur-sm">
@@ -0,0 +1,41 @@
+import imageVariants from '../data/imageVariants.json';
+
+const BASE_URL = import.meta.env.BASE_URL;
+
+const TYPES = {
+  avif: 'image/avif',
+  webp: 'image/webp'
+};
+
+// 把 src 轉成清單中的鍵（相對於 public 的路徑，例如 herbs/01_goji.png）
+const publicPath = (src) => {
+  const path = src.startsWith(BASE_URL) ? src.slice(BASE_URL.length) : src;
+  return path.replace(/^\.\//, '');
+};
+
+/**
+ * 響應式圖片組件
+ * 有經過 optimize_herb_images.py 處理的圖片以 <picture> 提供 AVIF / WebP 的 srcset，
+ * 由瀏覽器依支援格式與顯示寬度挑選；沒有最佳化版本時與一般 <img> 相同
+ */
+export default function ResponsiveImage({ src, sizes, ...props }) {
+  const entry = src ? imageVariants.images[publicPath(src)] : null;
+
+  if (!entry) {
+    return <img src={src} {...props} />;
+  }
+
+  return (
+    <picture>
+      {Object.entries(entry.sources).map(([format, variants]) => (
+        <source
+          key={format}
+          type={TYPES[format]}
+          sizes={sizes}
+          srcSet={variants.map(v => `${BASE_URL}${v.src} ${v.width}w`).join(', ')}
+        />
+      ))}
+      <img src={src} {...props} />
+    </picture>
+  );
+}
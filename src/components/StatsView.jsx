@@ -5,6 +5,7 @@ import {
 import { useUserStats } from '../hooks/useUserStats';
 import { useMemo } from 'react';
 import { herbImages } from '../data/calendarData';
+import ResponsiveImage from './ResponsiveImage';
 
 // 等級計算
 const calculateLevel = (totalMeditations, totalMinutes) => {
@@ -296,8 +297,9 @@ export default function StatsView({ herbsDatabase }) {
                 >
                   <div className="w-14 h-14 mx-auto bg-gradient-to-br from-amber-50 to-orange-50 rounded-xl flex items-center justify-center">
                     {herb.image ? (
-                      <img 
+                      <ResponsiveImage 
                         src={herb.image} 
+                        sizes="40px"
                         alt={herb.name}
                         className="w-10 h-10 object-contain"
                         onError={(e) => { e.target.style.display = 'none'; }}
@@ -4,7 +4,9 @@ import { useState } from 'react';
 import { solarTermImages, herbImages, herbMeditations } from '../data/calendarData';
 import MeditationPlayer from './MeditationPlayer';
 import { useUserStats } from '../hooks/useUserStats';
+import { useMeditationSources } from '../hooks/useMeditationSources';
 import ImageLightbox from './ImageLightbox';
+import ResponsiveImage from './ResponsiveImage';
 import ShareButton, { SHARE_TYPES } from './ShareButton';
 import FavoriteButton from './FavoriteButton';
 
@@ -64,6 +66,7 @@ export default function TodayView({ todayInfo, onOpenCalendar }) {
 
   const { herb, solarTerm, theme, seasonColor, meditation, dayOfYear, date } = todayInfo;
   const meditationSrc = getMeditationPath(herb.name);
+  const meditationSources = useMeditationSources(herb.id);
   const herbTags = getHerbTags(herb.effect);
   const wisdom = seasonWisdom[solarTerm.season] || seasonWisdom["春"];
   
@@ -205,8 +208,9 @@ export default function TodayView({ todayInfo, onOpenCalendar }) {
                   herb.effect
                 )}
               >
-                <img 
+                <ResponsiveImage 
                   src={getHerbImagePath(herb.name)}
+                  sizes="64px"
                   alt={herb.name}
                   className="w-16 h-16 object-contain"
                   onError={(e) => {
@@ -303,6 +307,7 @@ export default function TodayView({ todayInfo, onOpenCalendar }) {
                     <MeditationPlayer
                       herbName={herb.name}
                       audioSrc={meditationSrc}
+                      sources={meditationSources}
                       herbEffect={herb.effect}
                       seasonColor={seasonColor}
                       onComplete={handleMeditationComplete}
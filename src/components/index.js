@@ -7,3 +7,4 @@ export { default as BottomNav } from './BottomNav';
 export { default as MeditationPlayer } from './MeditationPlayer';
 export { default as ShareButton, SHARE_TYPES } from './ShareButton';
 export { default as FavoriteButton } from './FavoriteButton';
+export { default as ResponsiveImage } from './ResponsiveImage';
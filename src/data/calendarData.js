@@ -1,5 +1,8 @@
 // 2026 中藥正念日曆 - 行事曆資料
-// 從 calendar_2026_complete.json 轉換
+// 草藥與節氣的對照表；每日的藥材與節氣由下方的 getHerbForDate / getSolarTermForDate 計算
+
+import herbCatalogue from "./herbs.json";
+import solarTermData from "./solarTerms.json";
 
 export const metadata = {
   year: 2026,
@@ -7,77 +10,22 @@ export const metadata = {
   subtitle: "Traditional Chinese Medicine Mindfulness Calendar",
   version: "1.1.0",
   totalDays: 365,
-  totalHerbs: 56,
+  totalHerbs: herbCatalogue.herbs.length,
   description: "結合傳統中藥智慧與正念冥想的全年日曆，每日一藥一冥想，跟隨二十四節氣養生"
 };
 
-// 56種草藥資料庫 - 按節氣養生邏輯分類
+// 56種草藥資料庫 - 按節氣養生邏輯分類（資料來源：herbs.json，與冥想音檔生成器共用；
+// 冥想引導文字另存於 herb_narration.json，只有生成器使用，不打包進前端）
 // 冬季(1-14)：溫補腎陽、藏精固本
 // 春季(15-28)：疏肝理氣、活血養血  
 // 夏季(29-42)：清熱解暑、養心安神
 // 秋季(43-56)：滋陰潤燥、理氣和中
-export const herbsDatabase = [
-  // ===== 冬季養生 - 溫補腎陽、藏精固本 =====
-  { id: 1, name: "人參", effect: "大補元氣", season: "冬" },
-  { id: 2, name: "黃耆", effect: "補氣固表", season: "冬" },
-  { id: 3, name: "黨參", effect: "補中益氣", season: "冬" },
-  { id: 4, name: "白朮", effect: "健脾益氣", season: "冬" },
-  { id: 5, name: "茯苓", effect: "健脾寧心", season: "冬" },
-  { id: 6, name: "山藥", effect: "補脾養胃", season: "冬" },
-  { id: 7, name: "甘草", effect: "調和諸藥", season: "冬" },
-  { id: 8, name: "大棗", effect: "補中益氣", season: "冬" },
-  { id: 9, name: "紅棗", effect: "養血安神", season: "冬" },
-  { id: 10, name: "蜂蜜", effect: "補中潤燥", season: "冬" },
-  { id: 11, name: "龍骨", effect: "鎮靜安神", season: "冬" },
-  { id: 12, name: "牡蠣", effect: "收斂固澀", season: "冬" },
-  { id: 13, name: "磁石", effect: "鎮心安神", season: "冬" },
-  { id: 14, name: "琥珀", effect: "安神定志", season: "冬" },
-  // ===== 春季養生 - 疏肝理氣、活血養血 =====
-  { id: 15, name: "當歸", effect: "補血活血", season: "春" },
-  { id: 16, name: "白芍", effect: "養血柔肝", season: "春" },
-  { id: 17, name: "川芎", effect: "行氣活血", season: "春" },
-  { id: 18, name: "丹參", effect: "活血養心", season: "春" },
-  { id: 19, name: "紅花", effect: "活血祛瘀", season: "春" },
-  { id: 20, name: "桃仁", effect: "活血祛瘀", season: "春" },
-  { id: 21, name: "益母草", effect: "活血調經", season: "春" },
-  { id: 22, name: "雞血藤", effect: "補血活絡", season: "春" },
-  { id: 23, name: "三七", effect: "化瘀止血", season: "春" },
-  { id: 24, name: "延胡索", effect: "活血止痛", season: "春" },
-  { id: 25, name: "鬱金", effect: "行氣解鬱", season: "春" },
-  { id: 26, name: "薑黃", effect: "活血行氣", season: "春" },
-  { id: 27, name: "香附", effect: "理氣解鬱", season: "春" },
-  { id: 28, name: "枸杞", effect: "滋補肝腎", season: "春" },
-  // ===== 夏季養生 - 清熱解暑、養心安神 =====
-  { id: 29, name: "薄荷", effect: "疏散風熱", season: "夏" },
-  { id: 30, name: "菊花", effect: "清熱明目", season: "夏" },
-  { id: 31, name: "艾草", effect: "溫經止血", season: "夏" },
-  { id: 32, name: "茵陳", effect: "清利濕熱", season: "夏" },
-  { id: 33, name: "金錢草", effect: "清熱利濕", season: "夏" },
-  { id: 34, name: "車前草", effect: "清熱利尿", season: "夏" },
-  { id: 35, name: "澤瀉", effect: "利水滲濕", season: "夏" },
-  { id: 36, name: "滑石", effect: "清熱利濕", season: "夏" },
-  { id: 37, name: "通草", effect: "清熱利水", season: "夏" },
-  { id: 38, name: "薏苡仁", effect: "健脾祛濕", season: "夏" },
-  { id: 39, name: "龍眼肉", effect: "養血安神", season: "夏" },
-  { id: 40, name: "酸棗仁", effect: "安神助眠", season: "夏" },
-  { id: 41, name: "遠志", effect: "開心益智", season: "夏" },
-  { id: 42, name: "柏子仁", effect: "養心安神", season: "夏" },
-  // ===== 秋季養生 - 滋陰潤燥、理氣和中 =====
-  { id: 43, name: "地黃", effect: "滋陰養血", season: "秋" },
-  { id: 44, name: "阿膠", effect: "補血滋陰", season: "秋" },
-  { id: 45, name: "何首烏", effect: "補肝腎益精血", season: "秋" },
-  { id: 46, name: "桑椹", effect: "滋陰補血", season: "秋" },
-  { id: 47, name: "合歡皮", effect: "解鬱安神", season: "秋" },
-  { id: 48, name: "夜交藤", effect: "養血安神", season: "秋" },
-  { id: 49, name: "珍珠母", effect: "安神定驚", season: "秋" },
-  { id: 50, name: "陳皮", effect: "理氣健脾", season: "秋" },
-  { id: 51, name: "青皮", effect: "疏肝破氣", season: "秋" },
-  { id: 52, name: "枳實", effect: "破氣消積", season: "秋" },
-  { id: 53, name: "木香", effect: "行氣止痛", season: "秋" },
-  { id: 54, name: "烏藥", effect: "順氣止痛", season: "秋" },
-  { id: 55, name: "沉香", effect: "行氣止痛", season: "秋" },
-  { id: 56, name: "檀香", effect: "理氣和胃", season: "秋" }
-];
+export const herbsDatabase = herbCatalogue.herbs.map(({ id, name, effect, season }) => ({
+  id,
+  name,
+  effect,
+  season
+}));
 
 // 藥材圖片對照表 - 56種草藥各有專屬插圖
 export const herbImages = {
@@ -148,32 +96,8 @@ export function getHerbImage(herbName) {
   return herbImages[herbName] || null;
 }
 
-export const solarTerms = [
-  { name: "小寒", date: "2026-01-05", season: "冬" },
-  { name: "大寒", date: "2026-01-20", season: "冬" },
-  { name: "立春", date: "2026-02-04", season: "春" },
-  { name: "雨水", date: "2026-02-19", season: "春" },
-  { name: "驚蟄", date: "2026-03-05", season: "春" },
-  { name: "春分", date: "2026-03-20", season: "春" },
-  { name: "清明", date: "2026-04-04", season: "春" },
-  { name: "穀雨", date: "2026-04-20", season: "春" },
-  { name: "立夏", date: "2026-05-05", season: "夏" },
-  { name: "小滿", date: "2026-05-21", season: "夏" },
-  { name: "芒種", date: "2026-06-05", season: "夏" },
-  { name: "夏至", date: "2026-06-21", season: "夏" },
-  { name: "小暑", date: "2026-07-07", season: "夏" },
-  { name: "大暑", date: "2026-07-22", season: "夏" },
-  { name: "立秋", date: "2026-08-07", season: "秋" },
-  { name: "處暑", date: "2026-08-23", season: "秋" },
-  { name: "白露", date: "2026-09-07", season: "秋" },
-  { name: "秋分", date: "2026-09-23", season: "秋" },
-  { name: "寒露", date: "2026-10-08", season: "秋" },
-  { name: "霜降", date: "2026-10-23", season: "秋" },
-  { name: "立冬", date: "2026-11-07", season: "冬" },
-  { name: "小雪", date: "2026-11-22", season: "冬" },
-  { name: "大雪", date: "2026-12-07", season: "冬" },
-  { name: "冬至", date: "2026-12-21", season: "冬" }
-];
+// 二十四節氣（資料來源：solarTerms.json）
+export const solarTerms = solarTermData.terms;
 
 // 節氣圖片映射
 export const solarTermImages = {
@@ -244,12 +168,24 @@ export const seasonColors = {
   "冬": { primary: "#4299E1", secondary: "#63B3ED", bg: "from-blue-50 to-cyan-100" }
 };
 
+// 把節氣表的 "YYYY-MM-DD" 解析成當地時間的午夜
+// （new Date("YYYY-MM-DD") 會以 UTC 解析，在 UTC 以東的時區節氣會晚一天開始）
+export function parseLocalDate(dateString) {
+  const [year, month, day] = dateString.split('-').map(Number);
+  return new Date(year, month - 1, day);
+}
+
+// 取得指定日期是日曆的第幾天（2026-01-01 為第1天）
+// 以日期本身計算，不受時刻與夏令時間影響
+export function getDayOfYear(date) {
+  const targetDate = new Date(date);
+  const target = Date.UTC(targetDate.getFullYear(), targetDate.getMonth(), targetDate.getDate());
+  return Math.round((target - Date.UTC(2026, 0, 1)) / (1000 * 60 * 60 * 24)) + 1;
+}
+
 // 取得指定日期的藥材（循環54種藥材）
 export function getHerbForDate(date) {
-  const startOfYear = new Date(2026, 0, 1);
-  const targetDate = new Date(date);
-  const dayOfYear = Math.floor((targetDate - startOfYear) / (1000 * 60 * 60 * 24)) + 1;
-  const herbIndex = ((dayOfYear - 1) % 54);
+  const herbIndex = ((getDayOfYear(date) - 1) % 54);
   return herbsDatabase[herbIndex];
 }
 
@@ -258,10 +194,10 @@ export function getSolarTermForDate(date) {
   const targetDate = new Date(date);
   
   // 找出最接近且不超過目標日期的節氣
-  let currentTerm = { name: "冬至", date: "2025-12-22", season: "冬" }; // 預設為前一年冬至
+  let currentTerm = solarTermData.previous; // 預設為前一年冬至
   
   for (let i = 0; i < solarTerms.length; i++) {
-    const termDate = new Date(solarTerms[i].date);
+    const termDate = parseLocalDate(solarTerms[i].date);
     if (targetDate >= termDate) {
       currentTerm = solarTerms[i];
     } else {
@@ -300,67 +236,16 @@ ${herb.effect}，滋養身心。
 保持這份寧靜，感受內在的平和。`;
 }
 
-// 草藥冥想音檔映射 - 54種草藥各有專屬冥想音檔
-export const herbMeditations = {
-  // ===== 冬季養生草藥 =====
-  "人參": "./meditations/meditation_01_renshen.mp3",
-  "黃耆": "./meditations/meditation_02_huangqi.mp3",
-  "黨參": "./meditations/meditation_03_dangshen.mp3",
-  "白朮": "./meditations/meditation_04_baizhu.mp3",
-  "茯苓": "./meditations/meditation_05_fuling.mp3",
-  "山藥": "./meditations/meditation_06_shanyao.mp3",
-  "甘草": "./meditations/meditation_07_gancao.mp3",
-  "大棗": "./meditations/meditation_08_dazao.mp3",
-  "紅棗": "./meditations/meditation_09_hongzao.mp3",
-  "蜂蜜": "./meditations/meditation_10_fengmi.mp3",
-  "龍骨": "./meditations/meditation_11_longgu.mp3",
-  "牡蠣": "./meditations/meditation_12_muli.mp3",
-  "磁石": "./meditations/meditation_13_cishi.mp3",
-  "琥珀": "./meditations/meditation_14_hupo.mp3",
-  // ===== 春季養生草藥 =====
-  "當歸": "./meditations/meditation_15_danggui.mp3",
-  "白芍": "./meditations/meditation_16_baishao.mp3",
-  "川芎": "./meditations/meditation_17_chuanxiong.mp3",
-  "丹參": "./meditations/meditation_18_danshen.mp3",
-  "紅花": "./meditations/meditation_19_honghua.mp3",
-  "桃仁": "./meditations/meditation_20_taoren.mp3",
-  "益母草": "./meditations/meditation_21_yimucao.mp3",
-  "雞血藤": "./meditations/meditation_22_jixueteng.mp3",
-  "三七": "./meditations/meditation_23_sanqi.mp3",
-  "延胡索": "./meditations/meditation_24_yanhusuo.mp3",
-  "鬱金": "./meditations/meditation_25_yujin.mp3",
-  "薑黃": "./meditations/meditation_26_jianghuang.mp3",
-  "香附": "./meditations/meditation_27_xiangfu.mp3",
-  "枸杞": "./meditations/meditation_28_gouqi.mp3",
-  // ===== 夏季養生草藥 =====
-  "薄荷": "./meditations/meditation_29_bohe.mp3",
-  "菊花": "./meditations/meditation_30_juhua.mp3",
-  "艾草": "./meditations/meditation_31_aicao.mp3",
-  "茵陳": "./meditations/meditation_32_yinchen.mp3",
-  "金錢草": "./meditations/meditation_33_jinqiancao.mp3",
-  "車前草": "./meditations/meditation_34_cheqiancao.mp3",
-  "澤瀉": "./meditations/meditation_35_zexie.mp3",
-  "滑石": "./meditations/meditation_36_huashi.mp3",
-  "通草": "./meditations/meditation_37_tongcao.mp3",
-  "薏苡仁": "./meditations/meditation_38_yiyiren.mp3",
-  "龍眼肉": "./meditations/meditation_39_longyanrou.mp3",
-  "酸棗仁": "./meditations/meditation_40_suanzaoren.mp3",
-  "遠志": "./meditations/meditation_41_yuanzhi.mp3",
-  "柏子仁": "./meditations/meditation_42_baiziren.mp3",
-  // ===== 秋季養生草藥 =====
-  "地黃": "./meditations/meditation_43_dihuang.mp3",
-  "阿膠": "./meditations/meditation_44_ejiao.mp3",
-  "何首烏": "./meditations/meditation_45_heshouwu.mp3",
-  "桑椹": "./meditations/meditation_46_sangshen.mp3",
-  "合歡皮": "./meditations/meditation_47_hehuanpi.mp3",
-  "夜交藤": "./meditations/meditation_48_yejiaoteng.mp3",
-  "珍珠母": "./meditations/meditation_49_zhenzhumu.mp3",
-  "陳皮": "./meditations/meditation_50_chenpi.mp3",
-  "青皮": "./meditations/meditation_51_qingpi.mp3",
-  "枳實": "./meditations/meditation_52_zhishi.mp3",
-  "木香": "./meditations/meditation_53_muxiang.mp3",
-  "烏藥": "./meditations/meditation_54_wuyao.mp3"
-};
+// 草藥冥想音檔映射 - 有觀想引導文字的草藥（herbs.json 中標記 meditation）各有專屬冥想音檔
+// 檔名與生成器相同：meditation_{兩位數編號}_{拼音}.mp3
+export const herbMeditations = Object.fromEntries(
+  herbCatalogue.herbs
+    .filter((herb) => herb.meditation)
+    .map((herb) => [
+      herb.name,
+      `./meditations/meditation_${String(herb.id).padStart(2, "0")}_${herb.pinyin}.mp3`
+    ])
+);
 
 // 取得草藥冥想音檔路徑
 export function getHerbMeditation(herbName) {
@@ -1,10 +1,12 @@
-import { useState, useEffect, useMemo } from 'react';
+import { useState, useMemo } from 'react';
 import {
   getHerbForDate,
   getSolarTermForDate,
   getSolarTermTheme,
   getSeasonColor,
   generateMeditationText,
+  getDayOfYear,
+  parseLocalDate,
   herbsDatabase,
   solarTerms
 } from '../data/calendarData';
@@ -28,7 +30,7 @@ export function useCalendar(initialDate = new Date()) {
       theme,
       seasonColor,
       meditation,
-      dayOfYear: Math.floor((selectedDate - new Date(2026, 0, 1)) / (1000 * 60 * 60 * 24)) + 1
+      dayOfYear: getDayOfYear(selectedDate)
     };
   }, [selectedDate]);
 
@@ -92,7 +94,7 @@ export function useCalendar(initialDate = new Date()) {
     const year = selectedDate.getFullYear();
     const month = selectedDate.getMonth();
     return solarTerms.filter(term => {
-      const termDate = new Date(term.date);
+      const termDate = parseLocalDate(term.date);
       return termDate.getFullYear() === year && termDate.getMonth() === month;
     });
   }, [selectedDate]);
@@ -0,0 +1,43 @@
+import { useState, useEffect } from 'react';
+
+const MEDITATIONS_PATH = `${import.meta.env.BASE_URL}meditations/`;
+
+let renditionsPromise = null;
+
+// 讀取生成器寫出的版本清單 renditions.json（整個頁面只下載一次）
+const loadRenditions = () => {
+  if (!renditionsPromise) {
+    renditionsPromise = fetch(`${MEDITATIONS_PATH}renditions.json`)
+      .then(res => (res.ok ? res.json() : {}))
+      .then(data => data.herbs || {})
+      .catch(() => ({}));
+  }
+  return renditionsPromise;
+};
+
+// 取得草藥冥想音檔的各種版本 [{ src, type }]（依偏好順序）。
+// 清單載入前回傳 null，播放器等到版本確定才建立 <audio>；
+// 清單中沒有此草藥時回傳空陣列，播放器改用原本的 MP3
+export function useMeditationSources(herbId) {
+  const [loaded, setLoaded] = useState({ herbId: null, sources: [] });
+
+  useEffect(() => {
+    let cancelled = false;
+    loadRenditions().then(herbs => {
+      if (cancelled) return;
+      setLoaded({
+        herbId,
+        sources: (herbs[herbId] || []).map(({ src, type }) => ({
+          src: `${MEDITATIONS_PATH}${src}`,
+          type
+        }))
+      });
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [herbId]);
+
+  // 切換草藥後、新的版本確定前，不回傳前一個草藥的版本
+  return loaded.herbId === herbId ? loaded.sources : null;
+}
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 測試直接匯入專案根目錄的生成器模組
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
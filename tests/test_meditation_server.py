@@ -0,0 +1,71 @@
+"""即時生成服務：同時進行的生成彼此獨立，一個客戶端中斷或一個生成失敗不影響其他生成"""
+
+import asyncio
+
+import generate_all_meditations as gam
+import meditation_server as ms
+
+FIRST, SECOND = gam.CATALOGUE.herbs[0], gam.CATALOGUE.herbs[1]
+
+
+class SlowStreamBackend(gam.ToneBackend):
+    """分塊慢慢輸出的替代語音；含 broken 中任一詞的句子在短暫延遲後失敗"""
+    
+    def __init__(self, broken=()):
+        super().__init__()
+        self.broken = broken
+    
+    async def stream(self, text, voice, rate, pitch):
+        if any(word in text for word in self.broken):
+            await asyncio.sleep(0.2)
+            raise RuntimeError("合成失敗")
+        audio = await self.synthesize(text, voice, rate, pitch)
+        size = len(audio.data) // 4 + 1
+        for start in range(0, len(audio.data), size):
+            yield audio.data[start:start + size]
+            await asyncio.sleep(0.05)
+
+
+async def fetch(port: int, herb: dict, abort: bool = False) -> bytes:
+    """請求草藥的音檔；abort 時收到第一段資料就中斷連線"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /meditations/{herb['id']}.mp3 HTTP/1.1\r\nHost: test\r\n\r\n".encode("ascii"))
+    await writer.drain()
+    data = await (reader.read(1024) if abort else reader.read())
+    writer.close()
+    return data
+
+
+async def serve_both(tmp_path, backend, abort_first: bool):
+    service = ms.MeditationService(backend, gam.TTSCache(tmp_path / "tts"),
+                                   gam.TTSCache(tmp_path / "renders"), retries=0, jobs=2)
+    server = await asyncio.start_server(lambda r, w: ms.handle(service, r, w), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        # 第一個草藥先開始，共用的句子由它負責合成，第二個草藥等待同一次結果
+        first = asyncio.create_task(fetch(port, FIRST, abort=abort_first))
+        await asyncio.sleep(0.05)
+        second = await fetch(port, SECOND)
+        await first
+        while service._pending:
+            await asyncio.sleep(0.05)
+    return service, second
+
+
+def test_client_abort_does_not_affect_other_render(tmp_path):
+    service, second = asyncio.run(serve_both(tmp_path, SlowStreamBackend(), abort_first=True))
+    assert second.startswith(b"HTTP/1.1 200 OK")
+    assert second.endswith(b"0\r\n\r\n")
+    # 中斷的客戶端不會取消生成，兩個草藥都完成並寫入快取
+    assert service.failures == 0
+    assert service.renders == 2
+    assert len(service.cache._entries) == 2
+
+
+def test_failed_render_does_not_cancel_render_sharing_lines(tmp_path):
+    backend = SlowStreamBackend(broken=(FIRST["name"],))
+    service, second = asyncio.run(serve_both(tmp_path, backend, abort_first=False))
+    assert second.startswith(b"HTTP/1.1 200 OK")
+    assert second.endswith(b"0\r\n\r\n")
+    assert service.failures == 1
+    assert len(service.cache._entries) == 1
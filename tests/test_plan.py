@@ -0,0 +1,36 @@
+"""--plan 只估算工作量：不合成、不載入 edge-tts，也不在專案中建立任何檔案或目錄"""
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+PROJECT_FILES = ["generate_all_meditations.py", "herb_catalogue.py", "herb_narration.json",
+                 "src/data/herbs.json"]
+
+
+def snapshot(root: Path) -> set:
+    return {path.relative_to(root) for path in root.rglob("*")}
+
+
+@pytest.mark.parametrize("options", [
+    [],
+    ["--no-cache"],
+    ["--tts-backend", "tone", "--minutes", "5,10", "--start", "1", "--end", "3"],
+])
+def test_plan_leaves_tree_unchanged(tmp_path, options):
+    for name in PROJECT_FILES:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(ROOT / name, tmp_path / name)
+    before = snapshot(tmp_path)
+    
+    # -B：不寫 __pycache__，只檢查生成器本身寫入的內容
+    result = subprocess.run([sys.executable, "-B", "generate_all_meditations.py", "--plan", *options],
+                            cwd=tmp_path, capture_output=True, text=True, encoding="utf-8")
+    
+    assert result.returncode == 0, result.stderr
+    assert "[PLAN]" in result.stdout
+    assert snapshot(tmp_path) == before
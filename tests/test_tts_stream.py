@@ -0,0 +1,90 @@
+"""TTSClient.stream 的合併請求：同一句話由多個草藥共用時，一方中途放棄不影響其他方"""
+
+import asyncio
+
+import pytest
+
+import generate_all_meditations as gam
+
+SHARED = "感受呼吸的節奏，讓心慢慢安靜下來"
+BROKEN = "這一句合成會失敗"
+
+
+class SlowStreamBackend(gam.ToneBackend):
+    """把替代語音切成數塊慢慢輸出的串流後端；BROKEN 這句直接失敗"""
+    
+    async def stream(self, text, voice, rate, pitch):
+        if text == BROKEN:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("合成失敗")
+        audio = await self.synthesize(text, voice, rate, pitch)
+        size = len(audio.data) // 4 + 1
+        for start in range(0, len(audio.data), size):
+            yield audio.data[start:start + size]
+            await asyncio.sleep(0.05)
+
+
+class CollectingWriter:
+    def __init__(self):
+        self.pcm = bytearray()
+    
+    async def write(self, pcm: bytes):
+        self.pcm += pcm
+
+
+def make_client(tmp_path):
+    return gam.TTSClient(concurrency=4, cache=gam.TTSCache(tmp_path / "cache"),
+                         retries=0, backend=SlowStreamBackend())
+
+
+async def collect(tts, text, stop_after=None):
+    chunks = []
+    async for chunk in tts.stream(text):
+        chunks.append(chunk)
+        if stop_after is not None and len(chunks) >= stop_after:
+            await asyncio.sleep(3600)
+    return b"".join(chunks)
+
+
+def test_waiter_survives_cancelled_producer(tmp_path):
+    async def run():
+        tts = make_client(tmp_path)
+        expected = (await tts.backend.synthesize(SHARED, tts.voice, tts.rate, tts.pitch)).data
+        
+        producer = asyncio.create_task(collect(tts, SHARED, stop_after=1))
+        await asyncio.sleep(0.02)
+        waiter = asyncio.create_task(collect(tts, SHARED))
+        await asyncio.sleep(0.02)
+        producer.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await producer
+        assert await waiter == expected
+        # 等待者改為自行合成，結果寫入快取
+        assert tts.requests == 2
+        assert tts.cache.get(tts.cache.key(SHARED, tts.voice, tts.rate, tts.pitch,
+                                           tts.backend.version)) == expected
+        assert not tts._pending
+    
+    asyncio.run(run())
+
+
+def test_failed_herb_does_not_abort_herb_sharing_a_line(tmp_path):
+    async def run():
+        tts = make_client(tmp_path)
+        expected = gam.decode_to_pcm(
+            (await tts.backend.synthesize(SHARED, tts.voice, tts.rate, tts.pitch)).data)
+        
+        # 第一個草藥的 BROKEN 失敗時，會取消它前瞻合成中的 SHARED
+        failing = asyncio.create_task(
+            gam.write_script_pcm([(BROKEN, 0), (SHARED, 0)], tts, CollectingWriter()))
+        await asyncio.sleep(0.01)
+        writer = CollectingWriter()
+        healthy = asyncio.create_task(gam.write_script_pcm([(SHARED, 0)], tts, writer))
+        
+        results = await asyncio.gather(failing, healthy, return_exceptions=True)
+        assert isinstance(results[0], RuntimeError)
+        assert results[1] is None
+        assert bytes(writer.pcm) == expected
+    
+    asyncio.run(run())